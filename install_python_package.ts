@@ -1,4 +1,4 @@
-import { exec } from 'child_process';
+import { execFile } from 'child_process';
 import path from 'path';
 import fs from 'fs'
 import os from 'os';
@@ -20,21 +20,15 @@ const pythonPath = getPythonPath()
 
 async function installPythonPackage(packageName:string) {
   console.log(`install ${packageName}`)
-  const command = `${pythonPath} -m pip install ${packageName}`;
+  // 参数以数组传给 pip，不经过 shell，tree-sitter>=0.22 这样的版本约束不会被当成重定向
   return new Promise((resolve, reject)=>{
-    exec(command, (error, stdout, stderr) => {
+    execFile(pythonPath, ['-m', 'pip', 'install', packageName], (error, stdout, stderr) => {
       if (error) {
-        console.error(error);
+        console.error(stderr || error);
         return reject(error)
       }
-      if (stdout) {
-        console.log(stdout);
-        return resolve(stdout)
-      }
-      if (stderr) {
-        console.error(stderr);
-        return reject(stderr)
-      }
+      console.log(stdout);
+      return resolve(stdout)
     });
   })
 }
@@ -59,7 +53,25 @@ function parseRequirementsTxt() {
 
 const parsedRequirements = parseRequirementsTxt()
 
+function bundleTiktokenEncodings() {
+  // 切分用到的 tiktoken 编码随应用打包，运行时不需要下载
+  const scriptPath = path.join(process.cwd(),'src','assets','python_code','bundle_tiktoken.py')
+  return new Promise((resolve, reject)=>{
+    execFile(pythonPath, [scriptPath], { cwd: path.dirname(scriptPath) }, (error, stdout, stderr) => {
+      if (error) {
+        console.error(error);
+        return reject(error)
+      }
+      console.log(stdout);
+      return resolve(stdout)
+    });
+  })
+}
+
 Promise.all(parsedRequirements.map(installPythonPackage)).then(()=>{
   console.log('python package install success')
+  return bundleTiktokenEncodings()
+}).then(()=>{
+  console.log('tiktoken encodings bundled')
 })
 
@@ -0,0 +1,153 @@
+import importlib.util
+import math
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+from file_utils import get_cache_directory
+
+# max_input_tokens: 单条输入的 token 上限；max_inputs: 单次请求的输入条数上限；
+# max_request_tokens: 单次请求所有输入的 token 总数上限
+EMBEDDING_MODEL_LIMITS: Dict[str, Dict[str, int]] = {
+    'text-embedding-ada-002': {"max_input_tokens": 8191, "max_inputs": 2048, "max_request_tokens": 300000},
+    'text-embedding-3-small': {"max_input_tokens": 8191, "max_inputs": 2048, "max_request_tokens": 300000},
+    'text-embedding-3-large': {"max_input_tokens": 8191, "max_inputs": 2048, "max_request_tokens": 300000},
+}
+# 未知模型（例如第三方兼容接口）使用保守的限制
+DEFAULT_MODEL_LIMITS = {"max_input_tokens": 8191, "max_inputs": 256, "max_request_tokens": 8191}
+
+DEFAULT_ENCODING = 'cl100k_base'
+TOKENIZE_SLICE = 1024
+# 安装时由 bundle_tiktoken.py 下载的编码文件，文件名是 tiktoken 的缓存 key
+BUNDLED_TIKTOKEN_DIR = Path(__file__).resolve().parent / 'tiktoken_cache'
+
+
+def get_bundled_tiktoken_dirs() -> List[Path]:
+    """
+    随应用打包的编码文件目录：bundle_tiktoken.py 生成的目录，以及 llama_index 自带的 cl100k_base 缓存，
+    安装时跳过了下载步骤也能离线加载默认编码。只查找 llama_index 的安装位置，不导入它。
+    """
+    directories = [BUNDLED_TIKTOKEN_DIR]
+    try:
+        spec = importlib.util.find_spec('llama_index.core')
+    except (ImportError, ValueError):
+        spec = None
+    if spec is not None and spec.submodule_search_locations:
+        for location in spec.submodule_search_locations:
+            directories.append(Path(location) / '_static' / 'tiktoken_cache')
+    return [directory for directory in directories if directory.is_dir()]
+
+
+@lru_cache(maxsize=None)
+def configure_tiktoken_cache() -> Optional[str]:
+    """
+    让 tiktoken 从本地缓存目录加载编码，离线和首次启动时不需要下载。
+
+    没有指定 TIKTOKEN_CACHE_DIR 时使用共享缓存目录下的 tiktoken 目录，并把随应用打包的编码文件复制进去；
+    不直接使用打包目录，因为 tiktoken 在指定的缓存目录不可写时下载其他编码会报错。
+    """
+    if 'TIKTOKEN_CACHE_DIR' in os.environ or 'DATA_GYM_CACHE_DIR' in os.environ:
+        return os.environ.get('TIKTOKEN_CACHE_DIR', os.environ.get('DATA_GYM_CACHE_DIR'))
+    cache_directory = get_cache_directory() / 'tiktoken'
+    try:
+        cache_directory.mkdir(parents=True, exist_ok=True)
+        for bundled_directory in get_bundled_tiktoken_dirs():
+            for bundled in bundled_directory.iterdir():
+                if bundled.is_file() and not (cache_directory / bundled.name).exists():
+                    shutil.copyfile(bundled, cache_directory / bundled.name)
+    except OSError as e:
+        # 缓存目录不可用时退回 tiktoken 默认的临时目录
+        print(f'tiktoken cache directory is not available: {e}')
+        return None
+    os.environ['TIKTOKEN_CACHE_DIR'] = str(cache_directory)
+    return str(cache_directory)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str = 'text-embedding-ada-002'):
+    """
+    获取并缓存模型对应的 tiktoken 编码器，常驻进程中只加载一次。
+    """
+    configure_tiktoken_cache()
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def get_model_limits(model: str) -> Dict[str, int]:
+    return EMBEDDING_MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+
+
+class EmbeddingBatchPlanner:
+    """
+    按模型的 token 和输入条数限制规划嵌入请求：批量计算 token 数，截断超长文本，
+    并把文本按顺序均衡地分成若干批，使批数不少于并发数。
+    """
+
+    def __init__(self, model: str = 'text-embedding-ada-002', concurrency: int = 5,
+                 max_input_tokens: Optional[int] = None, max_inputs: Optional[int] = None,
+                 max_request_tokens: Optional[int] = None):
+        limits = get_model_limits(model)
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.max_input_tokens = max_input_tokens or limits["max_input_tokens"]
+        self.max_inputs = max_inputs or limits["max_inputs"]
+        self.max_request_tokens = max(self.max_input_tokens, max_request_tokens or limits["max_request_tokens"])
+
+    def count_tokens(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        计算每条文本的 token 数，超过 max_input_tokens 的文本会被截断。
+
+        :return: (可能被截断后的文本, token 数)
+        """
+        enc = get_tokenizer(self.model)
+        fitted: List[str] = []
+        counts: List[int] = []
+        # 分段编码，避免一次性持有整篇文档的 token 列表
+        for start in range(0, len(texts), TOKENIZE_SLICE):
+            part = texts[start:start + TOKENIZE_SLICE]
+            for text, tokens in zip(part, enc.encode_ordinary_batch(part)):
+                if len(tokens) > self.max_input_tokens:
+                    text = enc.decode(tokens[:self.max_input_tokens])
+                    tokens = tokens[:self.max_input_tokens]
+                fitted.append(text)
+                counts.append(len(tokens))
+        return fitted, counts
+
+    def plan(self, texts: List[str]) -> List[List[str]]:
+        return [batch for batch, _ in self.plan_with_tokens(texts)]
+
+    def plan_with_tokens(self, texts: List[str]) -> List[Tuple[List[str], int]]:
+        """
+        :return: [(批次文本, 批次 token 总数)]
+        """
+        if not texts:
+            return []
+        texts, counts = self.count_tokens(texts)
+        total_tokens = sum(counts)
+
+        # 满足限制所需的最少批数，再按并发数摊开，让每个并发请求的大小接近
+        min_batches = max(math.ceil(total_tokens / self.max_request_tokens), math.ceil(len(texts) / self.max_inputs))
+        num_batches = max(min_batches, min(self.concurrency, len(texts)))
+        target_tokens = max(1, math.ceil(total_tokens / num_batches))
+
+        batches: List[Tuple[List[str], int]] = []
+        cur_batch: List[str] = []
+        cur_tokens = 0
+        for text, count in zip(texts, counts):
+            if cur_batch and (cur_tokens + count > self.max_request_tokens or len(cur_batch) >= self.max_inputs):
+                batches.append((cur_batch, cur_tokens))
+                cur_batch, cur_tokens = [], 0
+            cur_batch.append(text)
+            cur_tokens += count
+            if cur_tokens >= target_tokens:
+                batches.append((cur_batch, cur_tokens))
+                cur_batch, cur_tokens = [], 0
+        if cur_batch:
+            batches.append((cur_batch, cur_tokens))
+        return batches
@@ -0,0 +1,96 @@
+"""
+对比句子组距离计算的两种实现：
+
+- legacy: SentenceCombination 字典列表 + Python float 列表，逐对调用 similarity
+- vectorized: 连续 float32 矩阵 + 一次批量余弦距离 + 数组运算找断点
+
+用法: python benchmarks/bench_distances.py --sizes 1000 10000 30000 --dim 1536
+"""
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llama_index.core.base.embeddings.base import similarity  # noqa: E402
+from utils import build_node_chunks, calculate_cosine_distances  # noqa: E402
+
+
+BATCH_SIZE = 100
+
+
+def api_batches(source):
+    # 模拟嵌入接口按批返回 Python float 列表
+    for start in range(0, len(source), BATCH_SIZE):
+        yield source[start:start + BATCH_SIZE].tolist()
+
+
+def legacy_path(sentences, source, threshold):
+    embeddings = [embedding for batch in api_batches(source) for embedding in batch]
+    groups = [
+        {"sentence": sentence, "index": i, "combined_sentence": sentence, "combined_sentence_embedding": embedding}
+        for i, (sentence, embedding) in enumerate(zip(sentences, embeddings))
+    ]
+    distances = []
+    for i in range(len(groups) - 1):
+        distances.append(1 - similarity(groups[i]["combined_sentence_embedding"],
+                                        groups[i + 1]["combined_sentence_embedding"]))
+    breakpoint_distance_threshold = np.percentile(distances, threshold)
+    indices_above_threshold = [i for i, x in enumerate(distances) if x > breakpoint_distance_threshold]
+    chunks = []
+    start_index = 0
+    for index in indices_above_threshold:
+        chunks.append("".join([d["sentence"] for d in groups[start_index: index + 1]]))
+        start_index = index + 1
+    if start_index < len(groups):
+        chunks.append("".join([d["sentence"] for d in groups[start_index:]]))
+    return chunks
+
+
+def vectorized_path(sentences, source, threshold):
+    matrix = np.empty(source.shape, dtype=np.float32)
+    for i, batch in enumerate(api_batches(source)):
+        matrix[i * BATCH_SIZE: i * BATCH_SIZE + len(batch)] = batch
+    return build_node_chunks(sentences, calculate_cosine_distances(matrix), threshold)
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    # tracemalloc 本身开销很大，单独跑一遍测峰值内存
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 30000], help="sentence group counts")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--threshold", type=int, default=80, help="breakpoint percentile threshold")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'groups':>8} {'legacy s':>10} {'vector s':>10} {'speedup':>8} {'legacy MB':>10} {'vector MB':>10}")
+    for size in args.sizes:
+        sentences = [f"sentence {i}. " for i in range(size)]
+        source = rng.standard_normal((size, args.dim), dtype=np.float32)
+
+        legacy_chunks, legacy_time, legacy_peak = measure(legacy_path, sentences, source, args.threshold)
+        vector_chunks, vector_time, vector_peak = measure(vectorized_path, sentences, source, args.threshold)
+        if len(legacy_chunks) != len(vector_chunks):
+            print(f"warning: chunk count differs ({len(legacy_chunks)} vs {len(vector_chunks)})")
+
+        print(f"{size:>8} {legacy_time:>10.3f} {vector_time:>10.3f} {legacy_time / vector_time:>7.1f}x "
+              f"{legacy_peak / 2 ** 20:>10.1f} {vector_peak / 2 ** 20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
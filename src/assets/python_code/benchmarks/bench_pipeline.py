@@ -0,0 +1,189 @@
+"""
+切分流水线的分阶段基准测试。
+
+在固定种子生成的语料（英文、中文、中英混排、短 PDF、长 PDF、代码目录）上运行真实的
+切分入口，嵌入使用进程内的 FakeEmbedding，不需要网络和 API key。
+
+每次运行前重置 metrics，运行后读取 get_metrics().snapshot()，各阶段的耗时、CPU 时间和调用次数
+都来自流水线自身的计时，与 --profile 输出的统计一致：
+
+    load -> normalize -> dedup -> sentence_split -> tokenize -> embed -> distances -> chunks -> serialize
+
+- 文本和 PDF 语料走 iter_text_document / iter_pdf_document（包含线程池和 PDF 多进程提取）
+- 代码目录走 get_code_document，即 codeChunker 按语法结构切分，阶段为 code_split
+- embed 在线程池中执行时，阶段累计时间可能大于整次运行的墙钟时间
+
+吞吐量按输出片段的字符数计算；tracemalloc 峰值内存单独跑一遍整条流水线得到。
+结果写入 JSON 文件，便于在版本之间对比回归。
+
+用法: python benchmarks/bench_pipeline.py --kinds en zh pdf_long --sizes 65536 1048576 --output bench.json
+"""
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_planner import get_tokenizer  # noqa: E402
+from embedding_scheduler import configure_embedding_scheduler  # noqa: E402
+from fixtures import CORPUS_KINDS, FakeEmbedding, build_corpus  # noqa: E402
+from metrics import get_metrics, serialize  # noqa: E402
+from utils import get_code_document, get_splitter, iter_pdf_document, iter_text_document  # noqa: E402
+
+# 输出时的阶段顺序，快照中其他阶段（embedding_request、chunk_embed 等）排在后面
+STAGES = ['load', 'normalize', 'dedup', 'sentence_split', 'tokenize', 'embed', 'distances', 'chunks',
+          'code_split', 'serialize']
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+
+def run_pipeline(kind: str, path: Path, splitter) -> list:
+    if kind == 'code':
+        return get_code_document(str(path), None, None, None, splitter=splitter)
+    iterate = iter_pdf_document if kind.startswith('pdf') else iter_text_document
+    return [chunk for chunks in iterate(str(path), None, None, None, splitter=splitter) for chunk in chunks]
+
+
+def measure(kind: str, path: Path, splitter) -> dict:
+    """完整运行一次切分和序列化，返回这次运行的 metrics 快照。"""
+    metrics = get_metrics()
+    metrics.reset()
+    result = run_pipeline(kind, path, splitter)
+    payload = serialize(result)
+    snapshot = metrics.snapshot()
+    snapshot["characters"] = sum(len(chunk["pageContent"]) for chunk in result)
+    snapshot["json_bytes"] = len(payload.encode('utf-8'))
+    return snapshot
+
+
+def get_traced_peak(kind: str, path: Path, splitter) -> int:
+    """整条流水线的 tracemalloc 峰值，tracemalloc 本身会明显拖慢计时，单独跑一遍。"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_pipeline(kind, path, splitter)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(kind: str, size: int, root: Path, splitter, repeat: int) -> dict:
+    path = build_corpus(kind, size, root)
+
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        snapshot = measure(kind, path, splitter)
+        if best is None or snapshot["wall_seconds"] < best["wall_seconds"]:
+            best = snapshot
+
+    characters = best["characters"]
+    names = [name for name in STAGES if name in best["stages"]]
+    names += [name for name in best["stages"] if name not in names]
+    stages = {}
+    for name in names:
+        stage = best["stages"][name]
+        stages[name] = {
+            "calls": stage["calls"],
+            "seconds": stage["seconds"],
+            "cpu_seconds": stage["cpu_seconds"],
+            "max_seconds": stage["max_seconds"],
+            "chars_per_second": characters / stage["seconds"] if stage["seconds"] else None,
+        }
+    return {
+        "kind": kind,
+        "size": size,
+        "files": sum(1 for file in path.rglob('*') if file.is_file()),
+        "counts": {**best["counts"], "characters": characters, "json_bytes": best["json_bytes"]},
+        "stages": stages,
+        "end_to_end": {
+            "seconds": best["wall_seconds"],
+            "cpu_seconds": best["cpu_seconds"],
+            "chars_per_second": characters / best["wall_seconds"] if best["wall_seconds"] else None,
+        },
+        "traced_peak_bytes": get_traced_peak(kind, path, splitter),
+        "peak_rss_bytes": best["peak_rss_bytes"],
+    }
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        version = json.loads((REPO_ROOT / 'package.json').read_text(encoding='utf-8')).get('version')
+    except (OSError, ValueError):
+        version = None
+    return {
+        "version": version,
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def print_result(result: dict) -> None:
+    counts = result["counts"]
+    details = " ".join(f"{name}={value}" for name, value in counts.items() if name not in ("characters", "json_bytes"))
+    print(f"\n{result['kind']} size={result['size']} chars={counts['characters']} {details}")
+    print(f"{'stage':>16} {'calls':>6} {'seconds':>10} {'cpu':>10} {'chars/s':>14}")
+    for stage, values in result["stages"].items():
+        speed = values["chars_per_second"]
+        print(f"{stage:>16} {values['calls']:>6} {values['seconds']:>10.4f} {values['cpu_seconds']:>10.4f} "
+              f"{speed or 0:>14.0f}")
+    print(f"{'end_to_end':>16} {'':>6} {result['end_to_end']['seconds']:>10.4f} "
+          f"{result['end_to_end']['cpu_seconds']:>10.4f}  traced peak "
+          f"{result['traced_peak_bytes'] / 1024 / 1024:.2f} MB")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--kinds", nargs='+', choices=CORPUS_KINDS, default=CORPUS_KINDS)
+    parser.add_argument("--sizes", type=int, nargs='+', default=[65536, 262144, 1048576],
+                        help="approximate corpus sizes in characters")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per corpus, the fastest is kept")
+    parser.add_argument("--dim", type=int, default=1536, help="fake embedding dimension")
+    parser.add_argument("--corpus_dir", help="keep generated corpora here instead of a temporary directory")
+    parser.add_argument("--output", default="bench_pipeline.json", help="machine readable result file")
+    args = parser.parse_args()
+
+    embed_model = FakeEmbedding(dim=args.dim)
+    try:
+        get_tokenizer(embed_model.model_name)
+    except Exception as e:
+        parser.error(f"tiktoken encoding is not available offline, set TIKTOKEN_CACHE_DIR: {e}")
+    # 只测 CPU 开销，不让额度限制引入等待
+    configure_embedding_scheduler(rpm=10 ** 9, tpm=10 ** 12)
+    splitter = get_splitter(embed_model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(args.corpus_dir or tmp)
+        results = []
+        for kind in args.kinds:
+            for size in args.sizes:
+                result = benchmark(kind, size, root, splitter, max(1, args.repeat))
+                print_result(result)
+                results.append(result)
+
+    report = {
+        "environment": get_environment(),
+        "parameters": {"repeat": args.repeat, "dim": args.dim},
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\nwritten to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+入口脚本的冷启动基准测试。
+
+每次在新的子进程中导入入口模块（不运行 main，不需要 socket 服务），重复若干次取中位数，
+任何一个入口超过预算时以非零状态退出。.github/workflows/startup-budget.yml 在 python_code 有改动时运行，
+防止慢模块重新回到启动路径上；本地可以用 npm run bench-startup。
+
+- 单次任务的入口只应该导入参数解析、连接和取消需要的模块，llama_index、openai 在连接后才加载
+- 常驻进程同样在 main 中才加载 llama_index，提取 PDF 的子进程重新导入 __main__ 时不会加载
+
+用法: python benchmarks/bench_startup.py --repeat 5 --output startup.json
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 入口模块和导入时间预算（秒）
+BUDGETS = {
+    'semantic_splitter': 1.0,
+    'semantic_splitter_text': 1.0,
+    'semantic_splitter_code': 1.0,
+    'semantic_directory': 1.0,
+    'worker': 1.0,
+}
+# 启动后不应该已经导入的模块
+DEFERRED_MODULES = ['llama_index.core', 'openai']
+
+
+def measure_import(module: str) -> dict:
+    code = (f"import json, sys, time; start = time.perf_counter(); import {module}; "
+            f"elapsed = time.perf_counter() - start; "
+            f"print(json.dumps([elapsed, [name for name in {DEFERRED_MODULES!r} if name in sys.modules]]))")
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    elapsed, loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"import": elapsed, "process": wall, "loaded": loaded}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--modules", nargs='+', choices=list(BUDGETS), default=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, for slow CI machines")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    failed = []
+    for module in args.modules:
+        # 第一次导入会生成 .pyc，不计入结果
+        measure_import(module)
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        budget = BUDGETS[module] * args.scale
+        result = {
+            "import": statistics.median(run["import"] for run in runs),
+            "process": statistics.median(run["process"] for run in runs),
+            "budget": budget,
+            "loaded": runs[-1]["loaded"],
+        }
+        results[module] = result
+        status = 'ok' if result["import"] <= budget else 'OVER BUDGET'
+        print(f"{module:24s} import {result['import']:.3f}s  process {result['process']:.3f}s  "
+              f"budget {budget:.1f}s  {status}")
+        if result["import"] > budget:
+            failed.append(module)
+        elif result["loaded"]:
+            print(f"{module:24s} imports deferred modules at startup: {', '.join(result['loaded'])}")
+            failed.append(module)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, indent=2)
+    if failed:
+        print(f"startup budget exceeded: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+基准测试用的确定性语料和离线嵌入模型。
+
+所有语料都由固定种子生成，同样的参数在不同版本之间得到完全相同的输入，
+结果才能横向比较。
+"""
+import random
+import zlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+# 每个话题一组词，段落内只从同一话题取词，话题切换处就是语义断点
+ENGLISH_TOPICS = [
+    "market stock investor shares price trading bank interest inflation bond profit revenue".split(),
+    "cat dog pet walk food vet puppy kitten leash toy play sleep".split(),
+    "rocket orbit planet launch satellite moon engine fuel crew mission gravity station".split(),
+    "garden soil seed flower water sun leaf root harvest tomato weed compost".split(),
+    "server request database cache query latency thread socket memory disk index log".split(),
+]
+CHINESE_TOPICS = [
+    "股票市场投资者价格交易银行利率通胀债券利润收入",
+    "小猫小狗宠物散步食物医生玩具睡觉喜欢主人",
+    "火箭轨道行星发射卫星月球引擎燃料宇航员任务",
+    "花园土壤种子鲜花浇水阳光叶子根部收获番茄",
+    "服务器请求数据库缓存查询延迟线程内存磁盘索引",
+]
+CODE_TEMPLATE = '''
+
+def {name}(items, limit={limit}):
+    """{doc}"""
+    result = []
+    for index, item in enumerate(items):
+        if index >= limit:
+            break
+        result.append(item * {factor})
+    return result
+
+
+class {cls}:
+    def __init__(self, value):
+        self.value = value
+
+    def {method}(self, other):
+        return self.value + other * {factor}
+'''
+
+CORPUS_KINDS = ['en', 'zh', 'mixed', 'pdf_short', 'pdf_long', 'code']
+PDF_PAGE_CHARS = 3000
+PDF_SHORT_PAGES = 4
+CODE_FILE_CHARS = 4000
+TEXT_FILE_CHARS = 256 * 1024
+
+
+def english_sentence(rng: random.Random, words: List[str]) -> str:
+    sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+    return sentence.capitalize() + rng.choice(['.', '.', '?', '!'])
+
+
+def chinese_sentence(rng: random.Random, chars: str, english: List[str] = None) -> str:
+    parts = []
+    for _ in range(rng.randint(3, 6)):
+        parts.append("".join(rng.choice(chars) for _ in range(rng.randint(2, 4))))
+        if english and rng.random() < 0.3:
+            # 中英混排，用来覆盖 remove_space_between_english_and_chinese
+            parts.append(f" {rng.choice(english)} ")
+    return "".join(parts) + rng.choice(['。', '。', '？', '！'])
+
+
+def generate_text(kind: str, size: int, seed: int = 0) -> str:
+    """生成约 size 个字符的文本，每个段落属于一个话题。"""
+    rng = random.Random(f"{kind}-{size}-{seed}")
+    paragraphs = []
+    total = 0
+    while total < size:
+        topic = rng.randrange(len(ENGLISH_TOPICS))
+        sentences = []
+        for _ in range(rng.randint(4, 12)):
+            if kind == 'en':
+                sentences.append(english_sentence(rng, ENGLISH_TOPICS[topic]))
+            elif kind == 'zh':
+                sentences.append(chinese_sentence(rng, CHINESE_TOPICS[topic]))
+            else:
+                sentences.append(chinese_sentence(rng, CHINESE_TOPICS[topic], ENGLISH_TOPICS[topic])
+                                 if rng.random() < 0.5 else english_sentence(rng, ENGLISH_TOPICS[topic]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 1
+    return "\n".join(paragraphs)[:size]
+
+
+def write_pdf(path: Path, pages: List[str]) -> None:
+    """写一个只包含 Helvetica 文本的最小 PDF，每页一段文本。"""
+    font = 3 + 2 * len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>"]
+    for i, text in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        lines = [text[start:start + 90] for start in range(0, len(text), 90)]
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        body = "BT /F1 8 Tf 20 780 Td 10 TL " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    path.write_bytes(bytes(out))
+
+
+def generate_code(size: int, seed: int = 0) -> str:
+    rng = random.Random(f"code-{size}-{seed}")
+    parts = ["import os\nimport sys\n"]
+    total = len(parts[0])
+    while total < size:
+        words = rng.choice(ENGLISH_TOPICS)
+        part = CODE_TEMPLATE.format(
+            name="_".join(rng.sample(words, 2)), limit=rng.randint(10, 1000), factor=rng.randint(2, 9),
+            doc=english_sentence(rng, words), cls="".join(w.capitalize() for w in rng.sample(words, 2)),
+            method="_".join(rng.sample(words, 2)),
+        )
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)
+
+
+def build_corpus(kind: str, size: int, root: Path, seed: int = 0) -> Path:
+    """
+    在 root 下生成约 size 个字符的语料，返回可以直接交给 iter_*_document 的路径。
+
+    - en / zh / mixed: 若干个 .txt 文件，单个文件不超过 TEXT_FILE_CHARS
+    - pdf_short: 多个 PDF_SHORT_PAGES 页的 PDF
+    - pdf_long: 一个 PDF，页数随 size 增长
+    - code: 两层目录的 .py 文件
+    """
+    target = root / f"{kind}-{size}"
+    target.mkdir(parents=True, exist_ok=True)
+    if kind in ('en', 'zh', 'mixed'):
+        text = generate_text(kind, size, seed)
+        for number, start in enumerate(range(0, len(text), TEXT_FILE_CHARS)):
+            (target / f"{number:04d}.txt").write_text(text[start:start + TEXT_FILE_CHARS], encoding='utf-8')
+    elif kind in ('pdf_short', 'pdf_long'):
+        text = generate_text('en', size, seed)
+        pages = [text[start:start + PDF_PAGE_CHARS] for start in range(0, len(text), PDF_PAGE_CHARS)]
+        per_file = PDF_SHORT_PAGES if kind == 'pdf_short' else len(pages)
+        for number, start in enumerate(range(0, len(pages), per_file)):
+            write_pdf(target / f"{number:04d}.pdf", pages[start:start + per_file])
+    elif kind == 'code':
+        code = generate_code(size, seed)
+        for number, start in enumerate(range(0, len(code), CODE_FILE_CHARS)):
+            package = target / f"pkg{number // 16:02d}"
+            package.mkdir(exist_ok=True)
+            (package / f"module{number:04d}.py").write_text(code[start:start + CODE_FILE_CHARS], encoding='utf-8')
+    else:
+        raise ValueError(f"unknown corpus kind: {kind}")
+    return target
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    确定性的离线嵌入：按文本的 crc32 从预先生成的单位向量池中取一行，
+    返回 Python float 列表，和真实接口的返回格式一致，几乎不占用 CPU。
+    """
+
+    dim: int = 1536
+    _pool: np.ndarray = PrivateAttr()
+
+    def __init__(self, dim: int = 1536, pool_size: int = 4096, **kwargs):
+        kwargs.setdefault('model_name', 'text-embedding-3-small')
+        super().__init__(dim=dim, **kwargs)
+        pool = np.random.default_rng(0).standard_normal((pool_size, dim)).astype(np.float32)
+        self._pool = pool / np.linalg.norm(pool, axis=1, keepdims=True)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        rows = [zlib.crc32(text.encode('utf-8')) % len(self._pool) for text in texts]
+        return self._pool[rows].tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
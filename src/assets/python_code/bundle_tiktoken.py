@@ -0,0 +1,24 @@
+"""
+安装时下载切分用到的 tiktoken 编码，保存到 tiktoken_cache 目录随应用打包，运行时离线加载。
+
+用法: python bundle_tiktoken.py
+"""
+import os
+
+import tiktoken
+
+from batch_planner import BUNDLED_TIKTOKEN_DIR, DEFAULT_ENCODING, EMBEDDING_MODEL_LIMITS
+
+
+def main():
+    BUNDLED_TIKTOKEN_DIR.mkdir(parents=True, exist_ok=True)
+    # tiktoken 在加载编码时读取缓存目录，下载的文件直接写入打包目录
+    os.environ['TIKTOKEN_CACHE_DIR'] = str(BUNDLED_TIKTOKEN_DIR)
+    encodings = {DEFAULT_ENCODING} | {tiktoken.encoding_name_for_model(model) for model in EMBEDDING_MODEL_LIMITS}
+    for name in sorted(encodings):
+        tiktoken.get_encoding(name)
+        print(f'bundled tiktoken encoding {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import threading
+from multiprocessing.pool import AsyncResult
+from typing import Any, Callable, List, Optional
+
+from metrics import get_metrics
+
+# 收到取消后等待切分线程退出的最长时间，超时后直接结束进程
+CANCEL_TIMEOUT = 10
+# 等待子进程结果时检查取消标记的间隔
+CHECK_INTERVAL = 0.2
+
+
+class SplitCancelled(BaseException):
+    """
+    切分任务被取消，在下一个检查点抛出。
+
+    与 asyncio.CancelledError 一样继承 BaseException，llama_index 加载文件时 except Exception
+    跳过出错文件的逻辑不会把取消当成空文件吞掉。
+    """
+
+
+class CancelToken:
+    """
+    进程级的协作式取消标记，线程安全。
+
+    切分流水线在文件、批次、窗口和页面之间调用 check，已取消时抛出 SplitCancelled；
+    on_cancel 注册的回调在取消时立即执行，用来取消排队的嵌入请求、中断正在进行的 HTTP 请求。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """回调在 reset 之后仍然保留，常驻进程的每个任务都会用到。"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def cancel(self, reason: str = 'cancelled') -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f'cancel callback failed: {e}')
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise SplitCancelled(self.reason)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._event.clear()
+            self.reason = None
+
+
+_token = CancelToken()
+
+
+def get_cancel_token() -> CancelToken:
+    return _token
+
+
+def check_cancelled() -> None:
+    _token.check()
+
+
+def wait_result(result: AsyncResult, interval: float = CHECK_INTERVAL) -> Any:
+    """等待子进程的结果，期间定期检查取消标记。"""
+    while not result.ready():
+        check_cancelled()
+        result.wait(interval)
+    return result.get()
+
+
+def request_cancel(reason: str, timeout: Optional[float] = CANCEL_TIMEOUT) -> None:
+    """
+    取消当前任务；timeout 秒后进程仍未退出时强制结束，保证取消在有限时间内完成。
+    """
+    _token.cancel(reason)
+    if timeout is not None:
+        timer = threading.Timer(timeout, os._exit, (1,))
+        timer.daemon = True
+        timer.start()
+
+
+_finished = threading.Event()
+
+
+def mark_finished() -> None:
+    """结果或取消报告已经发送给主进程，之后收到的 SIGTERM 直接退出。"""
+    _finished.set()
+
+
+def handle_sigterm() -> None:
+    """
+    主进程取消任务时和收到结果之后都会发送 SIGTERM：结果已经发送时正常退出，否则取消正在进行的任务。
+    """
+    if _finished.is_set():
+        sys.stdout.flush()
+        os._exit(0)
+    request_cancel('SIGTERM')
+
+
+def get_cancel_report(**extra) -> dict:
+    """取消时发送给主进程的内容：取消原因和已经完成的文档、片段数。"""
+    counts = get_metrics().snapshot()["counts"]
+    finished = {key: counts.get(key, 0) for key in ('documents', 'chunks', 'resumed_files')}
+    return {"cancelled": True, "reason": _token.reason, "finished": finished, **extra}
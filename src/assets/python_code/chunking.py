@@ -0,0 +1,185 @@
+import math
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 片段嵌入的计算方式：pooled 按句子长度加权合并已有的句子组嵌入，exact 对每个片段再请求一次嵌入
+CHUNK_EMBEDDING_MODES = ['pooled', 'exact']
+# 断点策略：percentile 按距离的百分位，standard_deviation 按距离的均值加若干倍标准差，
+# gradient 按距离变化率的均值加若干倍标准差
+BREAKPOINT_STRATEGIES = ['percentile', 'standard_deviation', 'gradient']
+# 流式切分时跨窗口保留的断点得分数，超过后蓄水池抽样
+STREAM_SCORE_SAMPLES = 1 << 16
+
+
+def calculate_threshold(slope_changes, factor):
+    """
+    根据给定的因子计算阈值。
+
+    :param slope_changes: 斜率变化量的数组
+    :param factor: 0到1之间的值，用于调节阈值的大小
+    :return: 计算出的阈值
+    """
+    mean_change = np.mean(slope_changes)
+    std_change = np.std(slope_changes)
+    threshold = mean_change + factor * std_change
+    return threshold
+
+
+def build_sentence_groups(sentences: List[str], buffer_size: int) -> List[str]:
+    """
+    把每个句子与前后 buffer_size 个句子拼接，得到用于计算嵌入的句子组。
+    """
+    return ["".join(sentences[max(0, i - buffer_size): i + buffer_size + 1]) for i in range(len(sentences))]
+
+
+def calculate_cosine_distances(embeddings: np.ndarray) -> np.ndarray:
+    """
+    一次性计算相邻句子组之间的余弦距离。
+
+    :param embeddings: 形状为 (n, dim) 的 float32 矩阵
+    :return: 长度为 n - 1 的距离数组
+    """
+    if len(embeddings) < 2:
+        return np.empty(0, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1)
+    dots = np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
+    denominators = norms[:-1] * norms[1:]
+    similarities = np.divide(dots, denominators, out=np.zeros_like(dots), where=denominators > 0)
+    return 1 - similarities
+
+
+def build_node_chunks(sentences: List[str], distances: Sequence[float], breakpoint_percentile_threshold) -> List[str]:
+    return ["".join(sentences[start:end])
+            for start, end in build_chunk_bounds(len(sentences), distances, breakpoint_percentile_threshold)]
+
+
+def build_chunk_bounds(count: int, distances: Sequence[float], breakpoint_percentile_threshold) -> List[Tuple[int, int]]:
+    """
+    :return: 每个片段包含的句子范围 [(start, end)]
+    """
+    distances = np.asarray(distances)
+    if len(distances) == 0:
+        # If, for some reason we didn't get any distances (i.e. very, very small documents) just
+        # treat the whole document as a single node
+        return [(0, count)]
+
+    return chunk_bounds(count, find_breakpoints(distances, breakpoint_percentile_threshold))
+
+
+def find_breakpoints(distances: np.ndarray, breakpoint_percentile_threshold) -> List[int]:
+    """
+    :return: 距离超过百分位阈值的位置，每个位置 i 表示在第 i 个句子之前断开
+    """
+    breakpoint_distance_threshold = np.percentile(distances, breakpoint_percentile_threshold)
+    # Chunk sentences into semantic groups based on percentile breakpoints
+    return (np.flatnonzero(distances > breakpoint_distance_threshold) + 1).tolist()
+
+
+def get_breakpoint_scores(distances: np.ndarray, strategy: str = 'percentile', breakpoint_percentile_threshold=95,
+                          factor: float = 1.0, history: Optional['ScoreHistory'] = None) -> Tuple[np.ndarray, float]:
+    """
+    :param history: 流式切分时之前窗口中已经确定的得分，阈值按它们和本窗口的得分一起计算
+    :return: (每个位置的断点得分, 阈值)，得分超过阈值的位置 i 表示可以在第 i + 1 个句子之前断开
+    """
+    if strategy not in BREAKPOINT_STRATEGIES:
+        raise ValueError(f"unknown breakpoint strategy: {strategy}")
+    scores = np.gradient(distances) if strategy == 'gradient' and len(distances) > 1 else distances
+    basis = scores if history is None else history.combine(scores)
+    if strategy == 'percentile':
+        return scores, np.percentile(basis, breakpoint_percentile_threshold)
+    return scores, calculate_threshold(basis, factor)
+
+
+class ScoreHistory:
+    """
+    流式切分时已经确定的位置的断点得分。只按当前窗口计算阈值时，每个窗口都会切出固定比例的断点，
+    片段明显多于整篇切分；按历史得分和本窗口得分一起计算，阈值逐渐接近整篇的阈值。
+    得分超过 max_samples 个后按蓄水池抽样保留，内存有上限。
+    """
+
+    def __init__(self, max_samples: int = STREAM_SCORE_SAMPLES, seed: int = 0):
+        self.max_samples = max_samples
+        self.samples = np.empty(0, dtype=np.float64)
+        self.seen = 0
+        self._random = np.random.default_rng(seed)
+
+    def add(self, scores: np.ndarray) -> None:
+        scores = np.asarray(scores, dtype=np.float64)
+        room = max(0, self.max_samples - len(self.samples))
+        if room:
+            self.samples = np.concatenate([self.samples, scores[:room]])
+            self.seen += len(scores[:room])
+            scores = scores[room:]
+        if len(scores):
+            # 第 t 个得分以 max_samples / t 的概率替换一个已有的样本
+            slots = self._random.integers(0, self.seen + 1 + np.arange(len(scores)))
+            replaced = slots < self.max_samples
+            self.samples[slots[replaced]] = scores[replaced]
+            self.seen += len(scores)
+
+    def combine(self, scores: np.ndarray) -> np.ndarray:
+        return np.concatenate([self.samples, scores]) if len(self.samples) else scores
+
+
+def bound_chunk_sizes(token_counts: Sequence[int], breaks: Sequence[bool], scores: Sequence[float],
+                      min_tokens: int = 0, max_tokens: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    一次线性扫描得到大小受限的片段范围。
+
+    在断点处断开，但片段不足 min_tokens 时继续合并；加入下一个句子会超过 max_tokens 时，
+    在当前片段内得分最高、且前半部分不少于 min_tokens 的位置断开（得分相同时取最靠后的位置），
+    没有这样的位置时就在这个句子之前断开。
+    最后一个片段不足 min_tokens 时并入前一个片段。单个句子超过 max_tokens 时单独成为一个片段。
+
+    :param token_counts: 每个句子的 token 数
+    :param breaks: breaks[i] 为 True 表示可以在第 i + 1 个句子之前断开
+    :param scores: 每个位置的断点得分，需要强制断开时用来选择位置
+    """
+    max_tokens = max_tokens or math.inf
+    prefix = [0]
+    for count in token_counts:
+        prefix.append(prefix[-1] + count)
+
+    bounds: List[Tuple[int, int]] = []
+    start = 0
+    for i, count in enumerate(token_counts):
+        if i > start and breaks[i - 1] and prefix[i] - prefix[start] >= min_tokens:
+            bounds.append((start, i))
+            start = i
+        while i > start and prefix[i + 1] - prefix[start] > max_tokens:
+            # 第一个使前半部分达到 min_tokens 的位置之后，选择得分最高的位置；得分相同时选择最靠后的位置，
+            # 让前一个片段尽量大，不会在前面切出很小的片段
+            first = max(start + 1, bisect_left(prefix, prefix[start] + min_tokens, start + 1, i + 1))
+            cut = i if first >= i else max(range(i, first - 1, -1), key=lambda position: scores[position - 1])
+            bounds.append((start, cut))
+            start = cut
+    if start < len(token_counts):
+        if (bounds and prefix[-1] - prefix[start] < min_tokens
+                and prefix[-1] - prefix[bounds[-1][0]] <= max_tokens):
+            start = bounds.pop()[0]
+        bounds.append((start, len(token_counts)))
+    return bounds
+
+
+def chunk_bounds(count: int, breakpoints: List[int]) -> List[Tuple[int, int]]:
+    bounds = [0, *breakpoints, count]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end]
+
+
+def join_chunks(sentences: List[str], breakpoints: List[int]) -> List[str]:
+    return ["".join(sentences[start:end]) for start, end in chunk_bounds(len(sentences), breakpoints)]
+
+
+def pool_embeddings(embeddings: np.ndarray, sentences: List[str], bounds: List[Tuple[int, int]]) -> np.ndarray:
+    """
+    把每个片段内句子组的嵌入按句子长度加权平均，再归一化到单位长度，作为片段的近似嵌入。
+
+    :param bounds: 首尾相接的句子范围，与 chunk_bounds 的返回值相同
+    :return: 形状为 (片段数, dim) 的 float32 矩阵
+    """
+    weights = np.fromiter(map(len, sentences), dtype=np.float32, count=len(sentences))
+    pooled = np.add.reduceat(embeddings * weights[:, None], [start for start, _ in bounds], axis=0)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return np.divide(pooled, norms, out=np.zeros_like(pooled), where=norms > 0)
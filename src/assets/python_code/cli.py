@@ -0,0 +1,257 @@
+import asyncio
+import json
+import threading
+from argparse import ArgumentParser, Namespace
+from importlib import import_module
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+import socketio
+
+from cancellation import get_cancel_report, mark_finished
+from chunking import BREAKPOINT_STRATEGIES, CHUNK_EMBEDDING_MODES
+from codeChunker import CODE_CHUNK_TOKENS
+from embedding_cache import EmbeddingCache
+from embedding_scheduler import configure_embedding_scheduler, get_embedding_scheduler
+from file_utils import get_cache_directory
+from file_walker import FileWalker
+from journal import SplitJournal, get_job_key
+from metrics import get_metrics, serialize, write_profile
+from normalizer import NORMALIZERS, DEFAULT_NORMALIZERS, TextNormalizer
+from pdf_cache import EVICTION_POLICIES, PDFTextCache
+from result_format import RESULT_ENCODINGS, write_result_file
+
+# 参数解析和连接只依赖较轻的模块，llama_index、openai 等在真正切分时才导入，入口可以很快启动
+if TYPE_CHECKING:
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from utils import BaseSentenceSplitter
+
+
+def preload_modules(*names: str) -> None:
+    """
+    在后台线程中提前导入较慢的模块，与参数解析、建立连接同时进行。
+    之后的 import 会等待同一个模块锁，不会重复加载。
+    """
+    def load():
+        for name in names:
+            import_module(name)
+
+    threading.Thread(target=load, daemon=True).start()
+
+
+async def import_deferred(name: str) -> ModuleType:
+    """在线程中导入模块，导入期间事件循环仍然可以处理取消消息和信号。"""
+    return await asyncio.to_thread(import_module, name)
+
+
+def add_embedding_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--proxy", help="proxy address")
+    parser.add_argument("--embedding_backend", choices=['openai', 'local'], default='openai',
+                        help="embedding backend used to find semantic breakpoints, local runs offline on the CPU")
+    parser.add_argument("--embedding_api_key", help="embedding api key, required by the openai backend")
+    parser.add_argument("--embedding_api_base", default="https://api.openai.com/v1", help="embedding api base")
+    parser.add_argument("--embedding_cache", help="embedding cache file, defaults to the shared cache directory")
+    parser.add_argument("--embedding_cache_size", type=int, default=512, help="embedding cache size limit in MB")
+    parser.add_argument("--embedding_cache_dtype", choices=['float32', 'float16'], default='float32',
+                        help="storage precision of cached embeddings")
+    parser.add_argument("--no_embedding_cache", action='store_true', help="disable the embedding cache")
+    parser.add_argument("--pdf_cache", help="extracted pdf text cache file, defaults to the shared cache directory")
+    parser.add_argument("--pdf_cache_size", type=int, default=256, help="pdf text cache size limit in MB")
+    parser.add_argument("--pdf_cache_eviction", choices=list(EVICTION_POLICIES), default='lru',
+                        help="which pdfs are dropped first when the pdf text cache is full: least recently used "
+                             "or oldest extracted")
+    parser.add_argument("--pdf_cache_max_age", type=float,
+                        help="drop pdf text cached more than this many days ago")
+    parser.add_argument("--no_pdf_cache", action='store_true', help="disable the pdf text cache")
+    parser.add_argument("--embedding_rpm", type=int, help="embedding requests per minute budget")
+    parser.add_argument("--embedding_tpm", type=int, help="embedding tokens per minute budget")
+    parser.add_argument("--embedding_concurrency", type=int, help="maximum concurrent embedding requests")
+    parser.add_argument("--normalize", nargs='+', default=[],
+                        choices=[name for name, normalizer in NORMALIZERS.items() if normalizer not in DEFAULT_NORMALIZERS],
+                        help="extra text normalizers chained with the default chinese/english space removal")
+    parser.add_argument("--stream_threshold", type=int, default=64,
+                        help="text files larger than this many MB are read and split in bounded-memory windows")
+    parser.add_argument("--chunk_embeddings", choices=CHUNK_EMBEDDING_MODES,
+                        help="return an embedding with every chunk so indexing can skip re-embedding: pooled "
+                             "averages the breakpoint embeddings for free, exact embeds each chunk once more; "
+                             "only reusable when the index uses the same embedding model")
+    parser.add_argument("--breakpoint_strategy", choices=BREAKPOINT_STRATEGIES, default='percentile',
+                        help="how semantic breakpoints are detected between sentence groups")
+    parser.add_argument("--breakpoint_factor", type=float, default=1.0,
+                        help="standard deviations above the mean for the standard_deviation and gradient strategies")
+    parser.add_argument("--min_chunk_tokens", type=int, default=0,
+                        help="merge chunks smaller than this many tokens with their neighbours")
+    parser.add_argument("--max_chunk_tokens", type=int,
+                        help="cut chunks before they exceed this many tokens, e.g. the index model's input limit")
+    parser.add_argument("--dedup", action='store_true',
+                        help="strip repeated PDF headers/footers and text blocks already seen in earlier files "
+                             "before embedding")
+
+
+def add_output_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--stream", action='store_true',
+                        help="emit chunks incrementally as <event>_chunk messages, then a final event with totals")
+    parser.add_argument("--stream_batch_size", type=int, default=0,
+                        help="chunks per streamed message, 0 sends one message per document")
+    parser.add_argument("--result_format", choices=['json', 'compact'], default='json',
+                        help="compact writes a columnar result with deduplicated metadata to a temp file "
+                             "and sends only a reference to it, ignored with --stream")
+    parser.add_argument("--result_encoding", choices=RESULT_ENCODINGS, default='msgpack',
+                        help="encoding of the compact result file, the Electron loaders read only json")
+    parser.add_argument("--result_dir", help="directory of compact result files, defaults to the system temp directory")
+
+
+def add_code_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--code_chunk_tokens", type=int, default=CODE_CHUNK_TOKENS,
+                        help="maximum tokens per code chunk, adjacent top-level definitions are merged up to it")
+    parser.add_argument("--code_workers", type=int,
+                        help="processes used to parse code files, defaults to one per CPU for large directories")
+
+
+def add_walker_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--exclude", nargs='+', default=[],
+                        help=".gitignore-style patterns skipped when walking directories, prefix ! to re-include "
+                             "files or directories excluded by default")
+    parser.add_argument("--include", nargs='+', default=[],
+                        help=".gitignore-style patterns, when given only matching files are split")
+    parser.add_argument("--no_default_excludes", action='store_true',
+                        help="also walk version control, dependency and build output directories such as .git, "
+                             "node_modules and dist")
+    parser.add_argument("--no_gitignore", action='store_true', help="ignore .gitignore files found in the directory")
+    parser.add_argument("--max_file_size", type=int, default=1024, help="skip files larger than this many MB")
+    parser.add_argument("--include_binary", action='store_true',
+                        help="do not skip files detected as binary by sniffing their first bytes")
+
+
+def add_journal_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--resume", action='store_true',
+                        help="journal every finished file so a cancelled or crashed run with the same inputs and "
+                             "options resumes from the last finished file")
+    parser.add_argument("--journal_dir", help="directory of progress journals, defaults to the shared cache directory")
+
+
+def add_profile_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--profile", help="append per-job stage metrics to this file as JSON lines")
+
+
+def get_embed_model_from_args(args: Namespace) -> 'BaseEmbedding':
+    if args.embedding_backend == 'local':
+        from local_embedding import LocalEmbedding
+        return LocalEmbedding()
+    if not args.embedding_api_key:
+        raise ValueError("--embedding_api_key is required by the openai embedding backend")
+    from utils import get_embed_model
+    return get_embed_model(args.embedding_api_key, args.embedding_api_base, args.proxy)
+
+
+def get_embedding_cache(args: Namespace) -> Optional[EmbeddingCache]:
+    # 本地嵌入的计算比查缓存还快
+    if args.no_embedding_cache or args.embedding_backend == 'local':
+        return None
+    path = args.embedding_cache or get_cache_directory() / 'embeddings.sqlite3'
+    return EmbeddingCache(path, max_bytes=args.embedding_cache_size * 1024 * 1024, dtype=args.embedding_cache_dtype)
+
+
+def get_pdf_cache(args: Namespace) -> Optional[PDFTextCache]:
+    if args.no_pdf_cache:
+        return None
+    path = args.pdf_cache or get_cache_directory() / 'pdf_text.sqlite3'
+    max_age = args.pdf_cache_max_age * 24 * 3600 if args.pdf_cache_max_age is not None else None
+    return PDFTextCache(path, max_bytes=args.pdf_cache_size * 1024 * 1024, eviction=args.pdf_cache_eviction,
+                        max_age=max_age)
+
+
+def get_file_walker_from_args(args: Namespace) -> FileWalker:
+    return FileWalker(exclude=args.exclude, include=args.include, default_excludes=not args.no_default_excludes,
+                      use_gitignore=not args.no_gitignore, max_file_size=args.max_file_size * 1024 * 1024,
+                      skip_binary=not args.include_binary)
+
+
+def get_splitter_from_args(args: Namespace) -> 'BaseSentenceSplitter':
+    from utils import get_splitter
+    configure_embedding_scheduler(rpm=args.embedding_rpm, tpm=args.embedding_tpm,
+                                  max_concurrency=args.embedding_concurrency)
+    return get_splitter(get_embed_model_from_args(args), embedding_cache=get_embedding_cache(args),
+                        pdf_cache=get_pdf_cache(args),
+                        file_walker=get_file_walker_from_args(args),
+                        text_normalizer=TextNormalizer.from_names(args.normalize),
+                        stream_threshold=args.stream_threshold * 1024 * 1024,
+                        chunk_embedding=args.chunk_embeddings,
+                        breakpoint_strategy=args.breakpoint_strategy, breakpoint_factor=args.breakpoint_factor,
+                        min_chunk_tokens=args.min_chunk_tokens, max_chunk_tokens=args.max_chunk_tokens,
+                        deduplicate=args.dedup)
+
+
+# 只影响运行方式、不影响切分结果的参数，不参与任务 key 的计算
+RUNTIME_ARGUMENTS = {
+    'proxy', 'embedding_api_key', 'embedding_cache', 'embedding_cache_size', 'embedding_cache_dtype',
+    'no_embedding_cache', 'pdf_cache', 'pdf_cache_size', 'pdf_cache_eviction', 'pdf_cache_max_age', 'no_pdf_cache',
+    'embedding_rpm', 'embedding_tpm', 'embedding_concurrency', 'stream', 'stream_batch_size',
+    'result_format', 'result_encoding', 'result_dir', 'resume', 'journal_dir', 'profile', 'pdf_workers',
+    'code_workers', 'path',
+}
+
+
+def open_journal(args: Namespace, kind: str, path: Optional[str] = None,
+                 resume: Optional[bool] = None) -> Optional[SplitJournal]:
+    """
+    --resume 时打开任务的进度日志，任务 key 由任务类型、输入路径和影响切分结果的参数决定。
+
+    :param path: 输入路径，默认取 args.path
+    :param resume: 常驻进程按任务指定，默认取 args.resume
+    """
+    if not (args.resume if resume is None else resume):
+        return None
+    options = {key: value for key, value in vars(args).items() if key not in RUNTIME_ARGUMENTS}
+    key = get_job_key(kind, path or args.path, options)
+    directory = args.journal_dir or get_cache_directory() / 'journals'
+    return SplitJournal(SplitJournal.default_path(directory, key), key)
+
+
+def get_split_stats(splitter: 'BaseSentenceSplitter', profile: Optional[str] = None, **extra) -> dict:
+    """
+    :param profile: 不为空时把统计追加写入该文件，extra 一并写入用于区分任务
+    """
+    stats = {}
+    if splitter.embedding_cache is not None:
+        stats["embedding_cache"] = splitter.embedding_cache.stats()
+    if splitter.pdf_cache is not None:
+        stats["pdf_cache"] = splitter.pdf_cache.stats()
+    stats["embedding_scheduler"] = get_embedding_scheduler().get_stats()
+    stats["metrics"] = get_metrics().snapshot()
+    if splitter.chunk_embedding is not None:
+        # 接收方据此判断片段嵌入能否直接用于索引
+        stats["chunk_embedding"] = {"mode": splitter.chunk_embedding, "model": splitter.embed_model.model_name}
+    if profile:
+        write_profile(profile, stats, **extra)
+    return stats
+
+
+def serialize_result(result: Union[List[Dict], Dict[str, Any]], result_format: str = 'json',
+                     result_encoding: str = 'msgpack', result_dir: Optional[str] = None) -> str:
+    """
+    按 --result_format 序列化最终结果。增量目录模式的结果是字典，只有其中的 documents 写入文件。
+    """
+    if result_format != 'compact':
+        return serialize(result)
+    if isinstance(result, dict):
+        return json.dumps({**result, "documents": write_result_file(result["documents"], result_encoding, result_dir)})
+    return json.dumps(write_result_file(result, result_encoding, result_dir))
+
+
+async def emit_cancelled(sio: socketio.AsyncClient, splitter: Optional['BaseSentenceSplitter'],
+                         journal: Optional[SplitJournal] = None, profile: Optional[str] = None,
+                         **extra) -> None:
+    """
+    任务取消后发送 split_stats 和 split_cancelled，说明取消原因和已经完成的部分，然后断开连接；
+    主进程不会确认 split_cancelled，不等待回调。
+    journal 保留在磁盘上，带 --resume 重新运行时从已完成的文件继续。
+    """
+    if journal is not None:
+        journal.close()
+        extra["journal"] = str(journal.path)
+    if splitter is not None:
+        await sio.emit('split_stats', json.dumps(get_split_stats(splitter, profile, cancelled=True, **extra)))
+    await sio.emit('split_cancelled', json.dumps(get_cancel_report(**extra)))
+    mark_finished()
+    await sio.disconnect()
@@ -0,0 +1,206 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from importlib import import_module
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from batch_planner import get_tokenizer
+from cancellation import check_cancelled
+from file_utils import get_file_metadata
+from file_walker import FileWalker
+from journal import SplitJournal, iter_journaled
+from metrics import get_metrics
+from result_format import chunk_to_result
+
+# 代码切分不需要 llama_index，只导入这个模块的入口可以很快启动
+
+# 后缀对应的 tree-sitter 语法包和其中返回语言的函数
+LANGUAGES: Dict[str, Tuple[str, str]] = {
+    '.py': ('tree_sitter_python', 'language'),
+    '.php': ('tree_sitter_php', 'language_php'),
+    '.js': ('tree_sitter_javascript', 'language'),
+    '.ts': ('tree_sitter_typescript', 'language_typescript'),
+    '.go': ('tree_sitter_go', 'language'),
+    '.cpp': ('tree_sitter_cpp', 'language'),
+    '.java': ('tree_sitter_java', 'language'),
+    '.rb': ('tree_sitter_ruby', 'language'),
+    '.cs': ('tree_sitter_c_sharp', 'language'),
+}
+CODE_SUFFIXES = list(LANGUAGES)
+
+# 每个片段的 token 上限，相邻的顶层定义合并到不超过这个大小
+CODE_CHUNK_TOKENS = 1024
+CODE_TOKENIZER_MODEL = 'text-embedding-ada-002'
+# 每个进程至少分到的文件数，文件太少时进程池的启动开销大于收益
+MIN_FILES_PER_WORKER = 8
+
+
+@lru_cache(maxsize=None)
+def get_parser(suffix: str):
+    """
+    获取并缓存后缀对应的解析器，每个进程每种语言只构建一次；没有安装对应的语法包时返回 None。
+    """
+    if not suffix.startswith('.'):
+        suffix = '.' + suffix
+    if suffix.lower() not in LANGUAGES:
+        return None
+    module_name, function_name = LANGUAGES[suffix.lower()]
+    try:
+        from tree_sitter import Language, Parser
+        language = getattr(import_module(module_name), function_name)()
+    except ImportError:
+        return None
+    return Parser(Language(language))
+
+
+class CodeChunker:
+    """
+    按语法树切分代码：顶层定义（连同前面的注释、装饰器）是最小的切分单位，相邻的定义合并到不超过 max_tokens；
+    单个定义超过上限时按它的子节点继续切分，没有子节点时按行切分，单行超过上限时按 token 截断。
+    """
+
+    def __init__(self, max_tokens: int = CODE_CHUNK_TOKENS, model: str = CODE_TOKENIZER_MODEL):
+        self.max_tokens = max_tokens
+        self.enc = get_tokenizer(model)
+
+    def split(self, source: str, suffix: str) -> List[str]:
+        parser = get_parser(suffix)
+        if parser is None:
+            pieces = self.split_lines(source)
+        else:
+            data = source.encode('utf-8')
+            root = parser.parse(data).root_node
+            pieces = self.split_node(data, root, 0, len(data))
+        return self.pack(pieces)
+
+    def split_node(self, data: bytes, node, start: int, end: int) -> List[Tuple[str, int]]:
+        """
+        把 [start, end) 切成以各个子节点结尾的若干段，节点之间的空白和注释归属后一个节点。
+
+        :return: [(文本, token 数)]，每段都不超过 max_tokens
+        """
+        segments = []
+        prev = start
+        for child in node.children:
+            if prev < child.end_byte <= end:
+                segments.append((prev, child.end_byte, child))
+                prev = child.end_byte
+        if prev < end:
+            segments.append((prev, end, None))
+
+        texts = [data[seg_start:seg_end].decode('utf-8', errors='replace') for seg_start, seg_end, _ in segments]
+        pieces: List[Tuple[str, int]] = []
+        for (seg_start, seg_end, child), text, tokens in zip(segments, texts, self.enc.encode_ordinary_batch(texts)):
+            if len(tokens) <= self.max_tokens:
+                pieces.append((text, len(tokens)))
+            elif child is not None and child.child_count:
+                pieces.extend(self.split_node(data, child, seg_start, seg_end))
+            else:
+                pieces.extend(self.split_lines(text))
+        return pieces
+
+    def split_lines(self, text: str) -> List[Tuple[str, int]]:
+        lines = text.splitlines(keepends=True)
+        pieces: List[Tuple[str, int]] = []
+        for line, tokens in zip(lines, self.enc.encode_ordinary_batch(lines)):
+            if len(tokens) <= self.max_tokens:
+                pieces.append((line, len(tokens)))
+                continue
+            for start in range(0, len(tokens), self.max_tokens):
+                part = tokens[start:start + self.max_tokens]
+                pieces.append((self.enc.decode(part), len(part)))
+        return pieces
+
+    def pack(self, pieces: Sequence[Tuple[str, int]]) -> List[str]:
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text, tokens in pieces:
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+
+def read_code(file: str) -> str:
+    with open(file, "r", encoding='utf-8', errors='replace') as fp:
+        return fp.read()
+
+
+def split_code_file(file: str, max_tokens: int = CODE_CHUNK_TOKENS, model: str = CODE_TOKENIZER_MODEL) -> List[str]:
+    # 在子进程中执行，按路径读取文件，只把切分结果传回主进程
+    return CodeChunker(max_tokens, model).split(read_code(file), Path(file).suffix)
+
+
+def get_num_workers(num_files: int, num_workers: Optional[int] = None) -> int:
+    """
+    :param num_workers: 切分的进程数，None 表示按 CPU 核数和文件数自动选择，1 表示串行
+    """
+    if num_workers is not None:
+        return max(1, min(num_workers, num_files))
+    return max(1, min(os.cpu_count() or 1, num_files // MIN_FILES_PER_WORKER))
+
+
+def iter_split_code_files(files: Sequence[str], max_tokens: int = CODE_CHUNK_TOKENS,
+                          num_workers: Optional[int] = None,
+                          model: str = CODE_TOKENIZER_MODEL) -> Iterator[Tuple[str, List[str]]]:
+    """按输入顺序逐个产出 (文件, 片段)，文件较多时在进程池中并行解析。"""
+    files = [str(file) for file in files]
+    num_workers = get_num_workers(len(files), num_workers)
+    if num_workers <= 1:
+        for file in files:
+            yield file, split_code_file(file, max_tokens, model)
+        return
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    try:
+        chunksize = max(1, len(files) // (num_workers * 4))
+        results = executor.map(split_code_file, files, repeat(max_tokens), repeat(model), chunksize=chunksize)
+        yield from zip(files, results)
+    finally:
+        # 调用方中途停止（例如任务被取消）时不再等待排队的文件
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_code_file(file: str) -> bool:
+    return Path(file).suffix.lower() in CODE_SUFFIXES
+
+
+def iter_code_documents(files: Sequence[str], max_tokens: int = CODE_CHUNK_TOKENS,
+                        num_workers: Optional[int] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    按语法树切分代码文件，逐个产出 (文件, 片段)。代码不做语义切分，不需要请求嵌入，
+    文件较多时在进程池中并行解析。
+    """
+    metrics = get_metrics()
+    for file, chunks in iter_split_code_files(files, max_tokens, num_workers):
+        check_cancelled()
+        path = Path(file)
+        metadata = {"file_name": path.name, "suffix": path.suffix.lower(), "source": str(path.resolve()),
+                    **get_file_metadata(file)}
+        documents = [chunk_to_result(content, metadata) for chunk in chunks if (content := chunk.strip())]
+        metrics.count('documents')
+        metrics.count('chunks', len(documents))
+        yield file, documents
+
+
+def get_code_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                      embed_model=None, splitter=None,
+                      max_tokens: int = CODE_CHUNK_TOKENS,
+                      num_workers: Optional[int] = None,
+                      journal: Optional[SplitJournal] = None,
+                      file_walker: Optional[FileWalker] = None) -> List[Dict]:
+    # 参数与其他 get_*_document 保持一致，代码切分用不到嵌入模型，语义分块器只提供文件遍历的规则
+    if file_walker is None and splitter is not None:
+        file_walker = splitter.file_walker
+    files = (file_walker or FileWalker()).walk(path, CODE_SUFFIXES)
+    if not files:
+        raise ValueError(f"No files found in {path}.")
+    with get_metrics().stage('code_split'):
+        split_files = partial(iter_code_documents, max_tokens=max_tokens, num_workers=num_workers)
+        return [chunk for _, chunks in iter_journaled(files, split_files, journal) for chunk in chunks]
@@ -0,0 +1,150 @@
+import re
+from typing import List, Optional, Sequence, Set, Tuple
+
+from batch_planner import get_tokenizer
+from metrics import get_metrics
+
+# 页眉页脚只在每页开头和结尾的若干行中查找
+EDGE_LINES = 2
+# 出现在至少这个比例的页面上（且不少于 MIN_REPEATED_PAGES 页）的边缘行视为页眉页脚
+REPEATED_PAGE_RATIO = 0.5
+MIN_REPEATED_PAGES = 3
+# 跨文件去重的块由连续 BLOCK_LINES 个非空行组成，总长度不少于 MIN_BLOCK_CHARS，避免误删常见的短行
+BLOCK_LINES = 4
+MIN_BLOCK_CHARS = 160
+
+DIGITS = re.compile(r'\d+')
+HASH_BASE = 1000003
+HASH_MASK = (1 << 61) - 1
+
+
+def record_suppressed(texts: List[str], counter: str, model: Optional[str] = 'text-embedding-ada-002') -> None:
+    """
+    记录没有发送给嵌入接口的文本：counter 累加条数，suppressed_tokens 累加 token 数。
+
+    :param model: 计算 token 数使用的模型，None 时只记录条数
+    """
+    if not texts:
+        return
+    metrics = get_metrics()
+    metrics.count(counter, len(texts))
+    if model is not None:
+        metrics.count('suppressed_tokens', sum(map(len, get_tokenizer(model).encode_ordinary_batch(texts))))
+
+
+def line_key(line: str) -> str:
+    """比较用的行内容：去掉首尾空白，数字统一替换，页码不同的页眉页脚也能匹配。"""
+    return DIGITS.sub('#', line.strip())
+
+
+def get_page_edges(lines: List[str]) -> Set[int]:
+    """页面开头和结尾 EDGE_LINES 个非空行的下标。"""
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    return set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+
+
+def find_repeated_edges(pages: Sequence[str]) -> Set[str]:
+    """在多数页面的开头或结尾重复出现的行（按 line_key 比较），即页眉、页脚和页码。"""
+    if len(pages) < MIN_REPEATED_PAGES:
+        return set()
+    counts = {}
+    for page in pages:
+        lines = page.splitlines(keepends=True)
+        for key in {line_key(lines[i]) for i in get_page_edges(lines)}:
+            counts[key] = counts.get(key, 0) + 1
+    min_pages = max(MIN_REPEATED_PAGES, REPEATED_PAGE_RATIO * len(pages))
+    return {key for key, count in counts.items() if count >= min_pages}
+
+
+def strip_page_edges(page: str, repeated: Set[str]) -> Tuple[str, List[str]]:
+    """
+    :return: (去除 repeated 中的边缘行后的页面文本, 被去除的行)
+    """
+    lines = page.splitlines(keepends=True)
+    edges = get_page_edges(lines)
+    kept = []
+    removed = []
+    for i, line in enumerate(lines):
+        if i in edges and line_key(line) in repeated:
+            removed.append(line)
+        else:
+            kept.append(line)
+    return "".join(kept), removed
+
+
+def strip_page_boilerplate(pages: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    去除在多数页面开头或结尾重复出现的行（页眉、页脚、页码）。
+
+    :return: (去除后的页面文本, 被去除的行)
+    """
+    repeated = find_repeated_edges(pages)
+    if not repeated:
+        return pages, []
+
+    stripped = []
+    removed = []
+    for page in pages:
+        text, lines = strip_page_edges(page, repeated)
+        stripped.append(text)
+        removed.extend(lines)
+    return stripped, removed
+
+
+class BlockDeduplicator:
+    """
+    跨文档去除重复的文本块（许可证声明、同一文件的多个副本等）。
+
+    每个非空行先算出哈希，再用多项式滚动哈希得到连续 BLOCK_LINES 行的块哈希；
+    在之前的文档中出现过的块从当前文档中去除，第一次出现的保留。同一文档内部的重复不处理。
+    """
+
+    def __init__(self, block_lines: int = BLOCK_LINES, min_block_chars: int = MIN_BLOCK_CHARS):
+        self.block_lines = block_lines
+        self.min_block_chars = min_block_chars
+        self.seen_blocks: Set[int] = set()
+        self.seen_documents: Set[int] = set()
+
+    def iter_block_hashes(self, keys: List[str]):
+        """产出 (块的起始位置, 块哈希)，块太短时跳过。"""
+        k = self.block_lines
+        if len(keys) < k:
+            return
+        line_hashes = [hash(key) & HASH_MASK for key in keys]
+        top = pow(HASH_BASE, k - 1, HASH_MASK)
+        block_hash = 0
+        chars = 0
+        for i, line_hash in enumerate(line_hashes):
+            if i >= k:
+                block_hash = (block_hash - line_hashes[i - k] * top) % HASH_MASK
+                chars -= len(keys[i - k])
+            block_hash = (block_hash * HASH_BASE + line_hash) % HASH_MASK
+            chars += len(keys[i])
+            if i >= k - 1 and chars >= self.min_block_chars:
+                yield i - k + 1, block_hash
+
+    def deduplicate(self, text: str) -> Tuple[str, List[str]]:
+        """
+        :return: (去除重复块后的文本, 被去除的非空行)；整个文档与之前的文档相同时返回空文本和文档的所有非空行
+        """
+        document_hash = hash(text)
+        if document_hash in self.seen_documents:
+            # 与去除部分重复块时一致，按行计数，duplicate_lines 不会因为整篇重复而只加 1
+            return "", [line for line in text.splitlines(keepends=True) if line.strip()]
+        self.seen_documents.add(document_hash)
+
+        lines = text.splitlines(keepends=True)
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        # 跨文件比较原始内容，只有数字不同的块（例如数值不同的表格）不是重复内容
+        keys = [lines[i].strip() for i in content]
+        removed_lines = set()
+        blocks = []
+        for start, block_hash in self.iter_block_hashes(keys):
+            blocks.append(block_hash)
+            if block_hash in self.seen_blocks:
+                removed_lines.update(content[start:start + self.block_lines])
+        self.seen_blocks.update(blocks)
+        if not removed_lines:
+            return text, []
+        kept = [line for i, line in enumerate(lines) if i not in removed_lines]
+        return "".join(kept), [lines[i] for i in sorted(removed_lines)]
@@ -0,0 +1,81 @@
+import hashlib
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from sqlite_cache import SQLiteCache
+
+DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+}
+
+
+def normalize_text(text: str) -> str:
+    # 空白差异不影响语义，统一后再计算哈希以提高命中率
+    return " ".join(text.split())
+
+
+class EmbeddingCache(SQLiteCache):
+    """
+    基于 SQLite 的内容寻址嵌入缓存。
+
+    键为 (model, api_base, 规范化文本) 的 sha256，向量以 float32/float16 的二进制形式保存，
+    总大小超过 max_bytes 时按最近访问时间淘汰。
+    """
+
+    TABLE = 'embeddings'
+    SCHEMA = ("key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL, "
+              "size INTEGER NOT NULL, last_access REAL NOT NULL")
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, dtype: str = 'float32'):
+        if dtype not in DTYPES:
+            raise ValueError(f"unsupported embedding cache dtype: {dtype}")
+        super().__init__(path, max_bytes)
+        self.dtype = dtype
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def get_many(self, namespace: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.make_key(namespace, text) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite 默认最多 999 个绑定参数
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, dtype, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=DTYPES[dtype]).astype(np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+            result = [found.get(key) for key in keys]
+            hits = sum(1 for embedding in result if embedding is not None)
+            self.hits += hits
+            self.misses += len(result) - hits
+        return result
+
+    def put_many(self, namespace: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=DTYPES[self.dtype]).tobytes()
+            rows.append((self.make_key(namespace, text), self.dtype, vector, len(vector), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dtype, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
@@ -0,0 +1,243 @@
+import asyncio
+import inspect
+import math
+import random
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from cancellation import SplitCancelled, check_cancelled, get_cancel_token
+from metrics import get_metrics
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 小于这个 token 数的请求主要是固定的往返开销，延迟不能反映服务端负载，不参与降低并发
+LATENCY_MIN_TOKENS = 1024
+# 同一大小档位（token 数按 2 的幂分档）的请求延迟的指数移动平均系数，以及判断延迟升高的倍数
+LATENCY_EWMA_ALPHA = 0.2
+LATENCY_FACTOR = 3
+# 每个档位至少有这么多次请求后才根据延迟降低并发
+LATENCY_WARMUP = 3
+
+# 同步函数在线程池中执行，协程函数直接在调度器的事件循环中执行
+EmbedFunc = Callable[[List[str]], Union[List[List[float]], Awaitable[List[List[float]]]]]
+
+
+def is_retryable(error: Exception) -> bool:
+    # openai 导入较慢，只在请求出错时才需要
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, 'status_code', None) in RETRYABLE_STATUS
+
+
+def is_throttled(error: Exception) -> bool:
+    import openai
+    if isinstance(error, openai.APITimeoutError):
+        return True
+    status_code = getattr(error, 'status_code', None) or 0
+    return status_code == 429 or status_code >= 500
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateBucket:
+    """
+    令牌桶：capacity 为每分钟额度，按秒均匀补充。
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # 超过桶容量的请求只要求桶满即可，否则永远无法发出
+        amount = min(amount, self.capacity)
+        self.refill()
+        if self.available >= amount:
+            return 0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+
+class EmbeddingScheduler:
+    """
+    进程级的嵌入请求调度器。
+
+    所有文档的嵌入批次都提交到同一个后台事件循环，统一遵守 RPM/TPM 额度，
+    对 429/5xx 和连接错误做指数退避重试，并做 AIMD 式的并发调整：429、5xx 和超时时减半，
+    大请求的延迟明显高于同样大小请求的移动平均时减一，其余成功的请求缓慢增加。
+    """
+
+    def __init__(self, rpm: int = 3000, tpm: int = 1000000, initial_concurrency: int = 5,
+                 max_concurrency: int = 16, max_retries: int = 6, max_backoff: float = 60):
+        self.requests = RateBucket(rpm)
+        self.tokens = RateBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(min(initial_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        # 大小档位 -> (延迟的移动平均, 请求次数)
+        self.latencies: Dict[int, Tuple[float, int]] = {}
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0, "cancelled": 0}
+        self._pending: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='embedding')
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._condition: Optional[asyncio.Condition] = None
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._thread = threading.Thread(target=self._run_loop, name='embedding-scheduler', daemon=True)
+        self._started = threading.Event()
+        self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._condition = asyncio.Condition()
+        self._rate_lock = asyncio.Lock()
+        self._started.set()
+        self._loop.run_forever()
+
+    def submit(self, func: EmbedFunc, texts: List[str], token_count: int) -> Future:
+        """线程安全，可以在任意线程中提交，返回 concurrent.futures.Future。"""
+        future = asyncio.run_coroutine_threadsafe(self._run(func, texts, token_count), self._loop)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future: Future) -> None:
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def embed(self, func: EmbedFunc, batches: List[List[str]], token_counts: List[int]) -> List[List[float]]:
+        check_cancelled()
+        futures = [self.submit(func, batch, tokens) for batch, tokens in zip(batches, token_counts)]
+        try:
+            return [embedding for future in futures for embedding in future.result()]
+        except CancelledError:
+            raise SplitCancelled(get_cancel_token().reason)
+
+    def cancel_all(self) -> None:
+        """取消所有排队和正在等待额度的批次；已经发出的请求结果被丢弃。线程安全。"""
+        with self._pending_lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.cancel()
+
+    async def _acquire(self, token_count: int) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        # 额度按获得并发槽位的顺序依次扣减
+        try:
+            async with self._rate_lock:
+                while True:
+                    delay = max(self.requests.wait_time(1), self.tokens.wait_time(token_count))
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.take(1)
+                self.tokens.take(token_count)
+        except asyncio.CancelledError:
+            await self._release()
+            raise
+
+    async def _release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_success(self, latency: float, token_count: int) -> None:
+        if token_count >= LATENCY_MIN_TOKENS:
+            # 只和大小相近的请求比较，批次大小不同导致的延迟差异不会被当成服务端饱和
+            bucket = int(math.log2(token_count))
+            average, samples = self.latencies.get(bucket, (latency, 0))
+            self.latencies[bucket] = (average + LATENCY_EWMA_ALPHA * (latency - average), samples + 1)
+            if samples >= LATENCY_WARMUP and latency > average * LATENCY_FACTOR:
+                # 延迟明显升高，说明服务端已经饱和
+                self.limit = max(1.0, self.limit - 1)
+                return
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _on_throttled(self) -> None:
+        self.stats["throttled"] += 1
+        self.limit = max(1.0, self.limit / 2)
+
+    async def _run(self, func: EmbedFunc, texts: List[str], token_count: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            await self._acquire(token_count)
+            start = time.monotonic()
+            try:
+                self.stats["requests"] += 1
+                if inspect.iscoroutinefunction(func):
+                    result = await func(texts)
+                else:
+                    result = await self._loop.run_in_executor(None, func, texts)
+            except asyncio.CancelledError:
+                # 协程中的请求随任务一起中断；线程中的同步请求无法中断，结果被丢弃
+                self.stats["cancelled"] += 1
+                await self._release()
+                raise
+            except Exception as e:
+                await self._release()
+                if is_throttled(e):
+                    self._on_throttled()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                get_metrics().count('retries')
+                backoff = get_retry_after(e) or min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1)
+                await asyncio.sleep(backoff)
+                continue
+            await self._release()
+            self._on_success(time.monotonic() - start, token_count)
+            return result
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "concurrency": int(self.limit)}
+
+    def reset_stats(self) -> None:
+        self.stats = {key: 0 for key in self.stats}
+
+
+_scheduler: Optional[EmbeddingScheduler] = None
+_scheduler_lock = threading.Lock()
+_scheduler_options: dict = {}
+
+
+def configure_embedding_scheduler(**options) -> None:
+    """在第一次使用前设置调度器参数（rpm、tpm、max_concurrency 等）。"""
+    _scheduler_options.update({key: value for key, value in options.items() if value is not None})
+
+
+def get_embedding_scheduler() -> EmbeddingScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EmbeddingScheduler(**_scheduler_options)
+            get_cancel_token().on_cancel(_scheduler.cancel_all)
+        return _scheduler
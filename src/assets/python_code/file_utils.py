@@ -0,0 +1,41 @@
+import mimetypes
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# 这里的函数只依赖标准库，不需要加载 llama_index 的入口（代码切分、参数解析）也能使用
+
+
+def get_cache_directory() -> Path:
+    """
+    各类持久化缓存的根目录，可通过环境变量 SPLITTER_CACHE_DIR 覆盖。
+    """
+    cache_directory = os.environ.get('SPLITTER_CACHE_DIR')
+    if cache_directory:
+        return Path(cache_directory)
+    return Path.home() / '.chatgpt-document-reader' / 'cache'
+
+
+def format_file_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    try:
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+    except Exception:
+        return None
+
+
+def get_file_metadata(file_path: str) -> Dict:
+    """
+    与 llama_index 的 default_file_metadata_func 在本地文件系统上的结果相同，不需要导入 llama_index。
+    """
+    stat_result = os.stat(file_path)
+    metadata = {
+        "file_path": file_path,
+        "file_name": os.path.basename(file_path),
+        "file_type": mimetypes.guess_type(file_path)[0],
+        "file_size": stat_result.st_size,
+        "creation_date": format_file_timestamp(stat_result.st_ctime),
+        "last_modified_date": format_file_timestamp(stat_result.st_mtime),
+    }
+    return {key: value for key, value in metadata.items() if value is not None}
+
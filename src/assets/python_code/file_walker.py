@@ -0,0 +1,246 @@
+import os
+import re
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from metrics import get_metrics
+
+# 版本控制目录、依赖目录、构建输出和系统生成的文件，默认不进入切分流程；
+# 需要时可以用 --exclude '!build/' 重新包含，或者用 --no_default_excludes 关闭
+DEFAULT_EXCLUDES = [
+    '.git/', '.hg/', '.svn/',
+    'node_modules/', 'bower_components/', '.venv/', 'venv/', '__pycache__/', '.tox/', '.mypy_cache/',
+    '.pytest_cache/', '.idea/', '.vscode/',
+    'dist/', 'build/', 'target/',
+    '__MACOSX/', '.DS_Store', 'Thumbs.db',
+]
+IGNORE_FILE = '.gitignore'
+# 超过这个大小的文件跳过，大文本文件仍然可以在这个范围内流式切分
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024 * 1024
+# 读取开头的这些字节判断是否是二进制文件
+SNIFF_BYTES = 8192
+# 有专门读取器的二进制格式，不做嗅探
+BINARY_FORMATS = {'.pdf'}
+# 文本中常见的控制字符：\b \t \n \f \r 和 ESC
+TEXT_CONTROL_BYTES = {8, 9, 10, 12, 13, 27}
+BINARY_CONTROL_RATIO = 0.3
+TEXT_BOMS = (b'\xef\xbb\xbf', b'\xff\xfe', b'\xfe\xff')
+
+
+class IgnorePattern(NamedTuple):
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+
+
+def compile_pattern(pattern: str) -> Optional[IgnorePattern]:
+    """
+    把一行 .gitignore 规则转换成正则：! 开头表示重新包含，/ 结尾只匹配目录，
+    中间或开头带 / 的规则相对规则所在目录匹配，否则匹配任意层级的文件名；支持 * ? [...] 和 **。
+    """
+    pattern = pattern.rstrip('\n')
+    if not pattern.strip() or pattern.startswith('#'):
+        return None
+    # 行尾没有转义的空格不属于规则
+    pattern = re.sub(r'(?<!\\) +$', '', pattern)
+    negate = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith('\\'):
+        pattern = pattern[1:]
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    if not pattern:
+        return None
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('/**', i) and i + 3 == len(pattern):
+            parts.append('/.*')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 2 if pattern[i + 1:i + 2] in ('!', '^') else i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                content = pattern[i + 1:end]
+                if content.startswith('!'):
+                    content = '^' + content[1:]
+                parts.append(f'[{content}]')
+                i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return IgnorePattern(re.compile(f'{prefix}{"".join(parts)}'), negate, dir_only)
+
+
+class IgnoreRules:
+    """
+    一组 .gitignore 风格的规则，base 是规则所在目录相对遍历根目录的路径，规则只作用于其下的路径。
+    """
+
+    def __init__(self, patterns: Sequence[str] = (), base: str = ''):
+        self.base = base
+        self.patterns = [compiled for pattern in patterns if (compiled := compile_pattern(pattern)) is not None]
+
+    @classmethod
+    def from_file(cls, file: str, base: str = '') -> 'IgnoreRules':
+        with open(file, 'r', encoding='utf-8', errors='replace') as fp:
+            return cls(fp.read().splitlines(), base)
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        :param path: 相对遍历根目录、以 / 分隔的路径
+        :return: True 表示排除，False 表示被 ! 规则重新包含，None 表示没有规则匹配
+        """
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return None
+            path = path[len(self.base) + 1:]
+        result = None
+        # 后面的规则优先
+        for pattern in self.patterns:
+            if pattern.dir_only and not is_dir:
+                continue
+            if pattern.regex.fullmatch(path):
+                result = not pattern.negate
+        return result
+
+
+def is_ignored(rules: Sequence[IgnoreRules], path: str, is_dir: bool) -> bool:
+    ignored = False
+    for rule in rules:
+        matched = rule.match(path, is_dir)
+        if matched is not None:
+            ignored = matched
+    return ignored
+
+
+def is_binary(file: str, sniff_bytes: int = SNIFF_BYTES) -> bool:
+    """
+    读取文件开头判断是否是二进制：包含 NUL 字节或控制字符比例过高。GBK 等非 UTF-8 编码的文本不会被误判。
+    """
+    with open(file, 'rb') as fp:
+        head = fp.read(sniff_bytes)
+    if not head or head.startswith(TEXT_BOMS):
+        return False
+    if b'\0' in head:
+        return True
+    control = sum(1 for byte in head if byte < 32 and byte not in TEXT_CONTROL_BYTES)
+    return control / len(head) > BINARY_CONTROL_RATIO
+
+
+class FileWalker:
+    """
+    单次遍历目录树，返回需要切分的文件列表，读取器直接使用，不再重复扫描目录。
+
+    基于 os.scandir 遍历，被排除的目录不会进入；规则使用 .gitignore 语法，依次为默认规则、exclude、
+    遍历到的各级 .gitignore，后面的规则优先。include 不为空时只保留匹配其中任一规则的文件。
+    另外跳过二进制文件和超过 max_file_size 的文件，跳过的数量记入 metrics。不进入指向目录的符号链接，避免循环。
+    """
+
+    def __init__(self, exclude: Sequence[str] = (), include: Sequence[str] = (), default_excludes: bool = True,
+                 use_gitignore: bool = True, max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+                 skip_binary: bool = True):
+        """
+        :param max_file_size: 单个文件的大小上限（字节），None 表示不限制
+        """
+        patterns = (DEFAULT_EXCLUDES if default_excludes else []) + list(exclude)
+        self.rules = IgnoreRules(patterns)
+        self.include = IgnoreRules(include) if include else None
+        self.use_gitignore = use_gitignore
+        self.max_file_size = max_file_size
+        self.skip_binary = skip_binary
+
+    def accept_file(self, file: str, size: int) -> bool:
+        metrics = get_metrics()
+        if self.max_file_size is not None and size > self.max_file_size:
+            metrics.count('oversized_files')
+            return False
+        if self.skip_binary and Path(file).suffix.lower() not in BINARY_FORMATS:
+            try:
+                binary = is_binary(file)
+            except OSError:
+                return False
+            if binary:
+                metrics.count('binary_files')
+                return False
+        return True
+
+    def walk(self, path: str, required_exts: Optional[Sequence[str]] = None, recursive: bool = True) -> List[Path]:
+        """
+        :param required_exts: 只保留这些后缀（区分大小写）的文件
+        :param recursive: 是否进入子目录
+        :return: 按路径排序的文件；path 是文件时只检查后缀、是否二进制和大小，通过时返回它本身，否则返回空列表
+        """
+        file = Path(path)
+        if file.is_file():
+            if required_exts is not None and file.suffix not in required_exts:
+                return []
+            try:
+                size = file.stat().st_size
+            except OSError:
+                return []
+            return [file] if self.accept_file(str(file), size) else []
+        metrics = get_metrics()
+        files = []
+        stack: List[Tuple[str, str, List[IgnoreRules]]] = [(str(path), '', [self.rules])]
+        while stack:
+            directory, relative, rules = stack.pop()
+            if self.use_gitignore:
+                ignore_file = os.path.join(directory, IGNORE_FILE)
+                if os.path.isfile(ignore_file):
+                    rules = rules + [IgnoreRules.from_file(ignore_file, relative)]
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                print(f'cannot list {directory}: {e}')
+                continue
+            for entry in entries:
+                entry_path = f'{relative}/{entry.name}' if relative else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+                if not is_dir and not is_file:
+                    continue
+                if is_ignored(rules, entry_path, is_dir):
+                    metrics.count('ignored_dirs' if is_dir else 'ignored_files')
+                    continue
+                if is_dir:
+                    if recursive:
+                        stack.append((entry.path, entry_path, rules))
+                    continue
+                if required_exts is not None and Path(entry.name).suffix not in required_exts:
+                    continue
+                if self.include is not None and not self.include.match(entry_path, False):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if self.accept_file(entry.path, size):
+                    files.append(Path(entry.path))
+        return sorted(files)
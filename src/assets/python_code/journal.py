@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from metrics import get_metrics
+
+JOURNAL_VERSION = 1
+
+
+def get_file_signature(file: str) -> List[int]:
+    stat = os.stat(file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_job_key(kind: str, path: str, options: Dict[str, Any]) -> str:
+    """同一类任务、同一输入路径和相同的切分选项得到相同的 key。"""
+    key = json.dumps({"kind": kind, "path": str(Path(path).resolve()), "options": options}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class SplitJournal:
+    """
+    切分任务的进度日志：每个文件切分完成后立即追加一行 JSON（文件、size/mtime、片段），
+    进程被 SIGTERM 结束或崩溃后，用相同的输入重新运行时直接复用已完成文件的片段。
+
+    日志第一行记录版本和任务 key，不一致时丢弃旧日志；最后一行可能写了一半，读取时忽略。
+    任务成功完成后调用 complete 删除日志。
+    """
+
+    def __init__(self, path: str, key: str):
+        self.path = Path(path)
+        self.key = key
+        self.files: Dict[str, dict] = {}
+        if self.path.is_file():
+            self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.files:
+            self._fp = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._fp = open(self.path, 'w', encoding='utf-8')
+            self._write({"version": JOURNAL_VERSION, "key": key})
+
+    def _load(self) -> None:
+        with open(self.path, 'rb') as fp:
+            try:
+                header = json.loads(fp.readline())
+            except ValueError:
+                return
+            if header.get('version') != JOURNAL_VERSION or header.get('key') != self.key:
+                return
+            valid_size = fp.tell()
+            while line := fp.readline():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is None or not line.endswith(b'\n'):
+                    # 进程在写入过程中被结束
+                    break
+                self.files[record["file"]] = record
+                valid_size = fp.tell()
+        # 截掉写了一半的最后一行，之后的记录接在完整的行后面
+        os.truncate(self.path, valid_size)
+
+    def _write(self, record: dict) -> None:
+        self._fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+        # 只需要在进程退出后保留，不需要在断电后保留，flush 到操作系统即可
+        self._fp.flush()
+
+    @staticmethod
+    def default_path(directory: Path, key: str) -> Path:
+        return Path(directory) / f"{key[:32]}.jsonl"
+
+    def get(self, file: str) -> Optional[List[dict]]:
+        """文件已完成且之后没有修改过时返回记录的片段。"""
+        record = self.files.get(str(file))
+        if record is None:
+            return None
+        try:
+            signature = get_file_signature(file)
+        except OSError:
+            # 记录之后文件被删除或无法访问，按过期处理，由切分流程报告错误
+            return None
+        if record["signature"] != signature:
+            return None
+        return record["chunks"]
+
+    def record(self, file: str, chunks: List[dict]) -> None:
+        record = {"file": str(file), "signature": get_file_signature(file), "chunks": chunks}
+        self.files[record["file"]] = record
+        self._write(record)
+
+    def close(self) -> None:
+        if not self._fp.closed:
+            self._fp.close()
+
+    def complete(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def iter_journaled(files: Sequence, split_files: Callable[[List], Iterator[Tuple[Any, List[Dict]]]],
+                   journal: Optional[SplitJournal] = None) -> Iterator[Tuple[Any, List[Dict]]]:
+    """
+    journal 中已经完成的文件直接产出记录的片段，其余文件交给 split_files 切分，每个文件完成后立即写入 journal。
+    """
+    if journal is None:
+        yield from split_files(files)
+        return
+    pending = []
+    for file in files:
+        chunks = journal.get(file)
+        if chunks is None:
+            pending.append(file)
+        else:
+            get_metrics().count('resumed_files')
+            yield file, chunks
+    for file, chunks in split_files(pending):
+        journal.record(file, chunks)
+        yield file, chunks
@@ -0,0 +1,72 @@
+import math
+import re
+import zlib
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field
+
+# 中日韩文字：假名、CJK 扩展 A、CJK 统一表意文字、韩文音节
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af'
+# 中日韩文字按单字切分后再组成二元组，其余文字按单词切分
+TOKEN_PATTERN = re.compile(f'([{CJK_RANGES}]+)|[^\\W\\d_{CJK_RANGES}]+|\\d+')
+
+
+def extract_features(text: str) -> List[str]:
+    features = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        cjk_run = match.group(1)
+        if cjk_run is None:
+            features.append(match.group())
+            continue
+        features.extend(cjk_run)
+        features.extend(a + b for a, b in zip(cjk_run, cjk_run[1:]))
+    return features
+
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    纯 CPU 的哈希词袋嵌入，不需要网络和 API key。
+
+    语义断点只依赖相邻句子组之间的相对距离，词汇重叠已经足够区分话题切换，
+    因此可以在离线环境中替代 OpenAIEmbedding。
+    """
+
+    dim: int = Field(default=1024, description="Number of hashed feature buckets.")
+
+    def __init__(self, dim: int = 1024, **kwargs):
+        kwargs.setdefault('model_name', f'local-hashing-{dim}')
+        kwargs.setdefault('embed_batch_size', 2048)
+        super().__init__(dim=dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in extract_features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                # crc32 在不同进程间稳定，最高位决定符号以减少哈希冲突带来的偏差
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                matrix[row, hashed % self.dim] += sign * (1 + math.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
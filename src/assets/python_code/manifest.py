@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        while block := fp.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestChanges(NamedTuple):
+    added: List[str]
+    modified: List[str]
+    unchanged: List[str]
+    deleted: List[str]
+
+
+class DirectoryManifest:
+    """
+    记录目录中每个文件的 path、size、mtime、内容哈希以及切分出的片段，用于增量重建索引。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.files: Dict[str, dict] = {}
+        self._pending: Dict[str, dict] = {}
+        if self.path.is_file():
+            with open(self.path, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+
+    @staticmethod
+    def default_path(directory: str) -> Path:
+        # 放在目录旁边而不是目录内部，避免被当作待切分的文件
+        directory = Path(directory).resolve()
+        return directory.parent / f"{directory.name}.manifest.json"
+
+    def diff(self, files: List[str]) -> ManifestChanges:
+        added, modified, unchanged = [], [], []
+        for file in files:
+            stat = os.stat(file)
+            record = self.files.get(file)
+            if record is not None and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+                unchanged.append(file)
+                continue
+            # size/mtime 变化时再比较内容哈希，仅被 touch 过的文件不需要重新切分
+            content_hash = hash_file(file)
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}
+            if record is None:
+                added.append(file)
+                self._pending[file] = entry
+            elif record['hash'] != content_hash:
+                modified.append(file)
+                self._pending[file] = entry
+            else:
+                record.update(entry)
+                unchanged.append(file)
+        existing = set(files)
+        deleted = [file for file in self.files if file not in existing]
+        return ManifestChanges(added, modified, unchanged, deleted)
+
+    def update(self, file: str, chunks: List[dict]) -> None:
+        entry = self._pending.pop(file)
+        entry["chunks"] = chunks
+        self.files[file] = entry
+
+    def remove(self, file: str) -> List[dict]:
+        record = self.files.pop(file, None)
+        return record.get('chunks', []) if record else []
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,87 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+def get_peak_rss() -> Optional[int]:
+    """进程启动以来的峰值常驻内存（字节），Windows 上没有 resource 模块时返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PipelineMetrics:
+    """
+    切分流水线的阶段计时和计数，线程安全。
+
+    每个阶段累计调用次数、墙钟时间、所在线程的 CPU 时间和单次最长耗时。
+    多个线程并行执行同一阶段时，累计时间可能大于整个任务的墙钟时间。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages: Dict[str, Dict[str, float]] = {}
+            self.counts: Dict[str, int] = {}
+            self.started = time.perf_counter()
+            self.cpu_started = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str):
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, time.thread_time() - cpu_start)
+
+    def record(self, name: str, seconds: float, cpu_seconds: float) -> None:
+        with self._lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "cpu_seconds": 0.0, "max_seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["cpu_seconds"] += cpu_seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "wall_seconds": time.perf_counter() - self.started,
+                "cpu_seconds": time.process_time() - self.cpu_started,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counts": dict(self.counts),
+                "peak_rss_bytes": get_peak_rss(),
+            }
+
+
+_metrics = PipelineMetrics()
+
+
+def get_metrics() -> PipelineMetrics:
+    return _metrics
+
+
+def serialize(result: Any) -> str:
+    with _metrics.stage('serialize'):
+        return json.dumps(result)
+
+
+def write_profile(file: str, stats: Dict[str, Any], **extra: Any) -> None:
+    """每个任务追加一行 JSON，便于离线汇总分析。"""
+    record = {"time": datetime.now(timezone.utc).isoformat(), **extra, **stats}
+    with open(file, 'a', encoding='utf-8') as fp:
+        fp.write(json.dumps(record) + '\n')
@@ -0,0 +1,141 @@
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Sequence, Tuple
+
+# 超过这个长度的文本分窗口处理，限制单次正则替换的中间内存
+WINDOW_SIZE = 1 << 20
+# 在窗口末尾向前找切分点的范围，找不到时窗口继续向后扩展
+CUT_LOOKBACK = 4096
+
+CHINESE_CHAR = re.compile('[\u4e00-\u9fff]')
+# 窗口只在两个相邻的单词字符之间切开，规则的匹配都包含空白或连字符，不会跨过这种位置
+WORD_PAIR = re.compile(r'\w(?=\w)')
+# 找不到单词字符对时的退路：两侧都不是空白和连字符，空格、换行和连字符相关的规则都不会跨过
+SAFE_PAIR = re.compile(r'[^\s-](?=[^\s-])')
+
+
+class Normalizer(NamedTuple):
+    """
+    一条规范化规则：pattern 的匹配替换为固定的 replacement。
+
+    pattern 的匹配不能跨过两个相邻的单词字符之间的位置，否则分窗口处理时可能漏掉。
+    applies 用来快速判断规则在一段文本上是否可能生效，返回 False 时整段跳过。
+    """
+    name: str
+    pattern: str
+    replacement: str
+    applies: Optional[Callable[[str], bool]] = None
+
+
+def contains_chinese(text: str) -> bool:
+    return not text.isascii() and CHINESE_CHAR.search(text) is not None
+
+
+# 去除中文与英文之间的单个空格，不包括包含换行符的情况；模式以空格开头，正则引擎可以直接跳到空格
+CHINESE_SPACE = Normalizer(
+    'chinese_space', ' (?:(?<=[\u4e00-\u9fff] )(?=\\w)|(?<=[a-zA-Z] )(?=[\u4e00-\u9fff]))', '', contains_chinese
+)
+# 连续的空格、制表符和全角空格合并成一个空格
+COLLAPSE_WHITESPACE = Normalizer('collapse_whitespace', '[ \t\u3000]{2,}', ' ')
+# PDF 换行处被连字符断开的英文单词重新接上
+REPAIR_HYPHENATION = Normalizer(
+    'repair_hyphenation', r'-(?<=[^\W\d_]-)[ \t]*\r?\n[ \t]*(?=[a-z])', '', lambda text: '-' in text
+)
+
+NORMALIZERS = {normalizer.name: normalizer for normalizer in (CHINESE_SPACE, COLLAPSE_WHITESPACE, REPAIR_HYPHENATION)}
+DEFAULT_NORMALIZERS: Tuple[Normalizer, ...] = (CHINESE_SPACE,)
+
+
+@lru_cache(maxsize=None)
+def compile_normalizers(normalizers: Tuple[Normalizer, ...]) -> Tuple[re.Pattern, object]:
+    """
+    把多条规则编译成一个正则，一次扫描完成所有替换。
+
+    :return: (pattern, repl)，只有一条规则时 repl 是固定字符串，走正则引擎的快速路径
+    """
+    if len(normalizers) == 1:
+        return re.compile(normalizers[0].pattern), normalizers[0].replacement
+    pattern = re.compile("|".join(f'(?P<n{i}>{normalizer.pattern})' for i, normalizer in enumerate(normalizers)))
+    replacements = {f'n{i}': normalizer.replacement for i, normalizer in enumerate(normalizers)}
+    return pattern, lambda match: replacements[match.lastgroup]
+
+
+def find_cut(text: str, end: int, pattern: re.Pattern = WORD_PAIR) -> int:
+    """返回不晚于 end 的切分点，切分点两侧都是单词字符；找不到时返回 -1。"""
+    start = max(0, end - CUT_LOOKBACK)
+    cut = -1
+    for match in pattern.finditer(text, start, end):
+        cut = match.end()
+    return cut
+
+
+def find_forced_cut(text: str, end: int) -> int:
+    """
+    在 end 附近找不到单词字符对时使用：优先在两个非空白、非连字符的字符之间切开，
+    仍然找不到时（整段都是空白）直接在 end 处切开，这时连续空白的合并可能在切分点两侧各保留一个空格。
+    """
+    cut = find_cut(text, end, SAFE_PAIR)
+    return cut if cut > 0 else end
+
+
+class TextNormalizer:
+    """
+    文本规范化阶段：多条规则合并成一次扫描，大文本按窗口处理，
+    不可能生效的规则（例如纯英文文本上的中英文空格规则）直接跳过。
+    """
+
+    def __init__(self, normalizers: Sequence[Normalizer] = DEFAULT_NORMALIZERS, window_size: int = WINDOW_SIZE):
+        self.normalizers = tuple(normalizers)
+        self.window_size = window_size
+
+    @classmethod
+    def from_names(cls, names: Iterable[str] = (), **kwargs) -> "TextNormalizer":
+        """默认规则之外再串联按名称指定的规则。"""
+        extra = [NORMALIZERS[name] for name in names if NORMALIZERS[name] not in DEFAULT_NORMALIZERS]
+        return cls((*DEFAULT_NORMALIZERS, *extra), **kwargs)
+
+    def normalize_window(self, text: str) -> str:
+        active = tuple(normalizer for normalizer in self.normalizers
+                       if normalizer.applies is None or normalizer.applies(text))
+        if not active:
+            return text
+        pattern, repl = compile_normalizers(active)
+        return pattern.sub(repl, text)
+
+    def iter_windows(self, text: str) -> Iterator[str]:
+        start = 0
+        while len(text) - start > self.window_size:
+            end = start + self.window_size
+            cut = find_cut(text, end)
+            while cut <= start and end < len(text):
+                # 窗口末尾没有合适的切分点，继续向后扩展
+                end = min(len(text), end + CUT_LOOKBACK)
+                cut = find_cut(text, end) if end < len(text) else len(text)
+            yield text[start:cut]
+            start = cut
+        yield text[start:]
+
+    def normalize(self, text: str) -> str:
+        if len(text) <= self.window_size:
+            return self.normalize_window(text)
+        return "".join(self.normalize_window(window) for window in self.iter_windows(text))
+
+    def iter_normalized(self, chunks: Iterable[str], window_size: Optional[int] = None) -> Iterator[str]:
+        """
+        流式规范化：输入任意切分的文本块，按窗口输出规范化后的文本，拼起来与 normalize 的结果相同。
+
+        :param window_size: 输出窗口的大小，默认与 normalize 相同；输入来得慢时（逐页提取的 PDF）用更小的窗口尽早输出
+        """
+        window_size = window_size or self.window_size
+        buffer = ''
+        for chunk in chunks:
+            buffer += chunk
+            while len(buffer) > window_size:
+                cut = find_cut(buffer, len(buffer))
+                if cut <= 0:
+                    # 末尾没有单词字符对时在窗口大小处强制切开，不再继续拼接，缓冲区不会无限增长
+                    cut = find_forced_cut(buffer, window_size)
+                yield self.normalize_window(buffer[:cut])
+                buffer = buffer[cut:]
+        if buffer:
+            yield self.normalize_window(buffer)
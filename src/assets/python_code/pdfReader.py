@@ -1,32 +1,175 @@
 import io
-
+import multiprocessing
+import os
+from collections import deque
+from itertools import chain, islice
 
 from llama_index.readers.file import PDFReader
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fsspec import AbstractFileSystem
 
 from llama_index.core.readers.file.base import get_default_fs, is_default_fs
 from llama_index.core.schema import Document
-class Reader(PDFReader):
-    def load_data(
-        self,
-        file: Path,
-        extra_info: Optional[Dict] = None,
-        fs: Optional[AbstractFileSystem] = None,
-    ) -> List[Document]:
-        """Parse file."""
-        if not isinstance(file, Path):
-            file = Path(file)
 
+from cancellation import SplitCancelled, check_cancelled, wait_result
+from pdf_extract import extract_pages
+from dedup import find_repeated_edges, record_suppressed, strip_page_boilerplate, strip_page_edges
+from manifest import hash_file
+from pdf_cache import PDFTextCache
+
+# 每个进程至少分到的页数。spawn 方式启动一个子进程要零点几秒，单页提取只要几毫秒，
+# 页数不够多时串行更快，自动选择时至少 2 * MIN_PAGES_PER_WORKER 页才并行
+MIN_PAGES_PER_WORKER = 256
+# 逐页流式读取时，根据开头这么多页判断页眉页脚
+BOILERPLATE_SAMPLE_PAGES = 128
+
+
+def get_extraction_options() -> Dict[str, str]:
+    """
+    影响提取结果的选项，作为提取缓存 key 的一部分，升级 pypdf 后不再使用旧版本提取的文本。
+    缓存同时保存每页文本和页码标签，整篇和逐页两种返回方式共用同一条记录。
+    """
+    import pypdf
+    return {"extractor": "pypdf", "version": pypdf.__version__}
+
+
+class Reader(PDFReader):
+    def __init__(self, return_full_document: Optional[bool] = False, num_workers: Optional[int] = None,
+                 strip_boilerplate: bool = False, text_cache: Optional[PDFTextCache] = None,
+                 token_model: Optional[str] = 'text-embedding-ada-002') -> None:
+        """
+        :param num_workers: 提取文本的进程数，None 表示按 CPU 核数和页数自动选择，1 表示串行
+        :param strip_boilerplate: 去除在多数页面上重复出现的页眉、页脚和页码
+        :param text_cache: 提取结果的持久化缓存，按文件内容命中，只用于本地文件
+        :param token_model: 统计被去除的页眉页脚的 token 数使用的模型，None 时只记录行数
+        """
+        super().__init__(return_full_document=return_full_document)
+        self.num_workers = num_workers
+        self.strip_boilerplate = strip_boilerplate
+        self.text_cache = text_cache
+        self.token_model = token_model
+        self._pool = None
+
+    def get_pool(self, num_workers: int):
+        """进程池在同一个任务的所有文件之间复用，任务结束时调用 close。"""
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(num_workers)
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def terminate(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def get_num_workers(self, num_pages: int) -> int:
+        if self.num_workers is not None:
+            return max(1, min(self.num_workers, num_pages))
+        return max(1, min(os.cpu_count() or 1, num_pages // MIN_PAGES_PER_WORKER))
+
+    def extract_text(self, pdf, file: Path, parallel: bool) -> List[str]:
+        num_pages = len(pdf.pages)
+        num_workers = self.get_num_workers(num_pages) if parallel else 1
+        if num_workers <= 1:
+            page_texts = []
+            for page in range(num_pages):
+                check_cancelled()
+                page_texts.append(pdf.pages[page].extract_text())
+            return page_texts
+
+        # 按连续页段分片，每个进程只解析一次 PDF 结构，结果按顺序拼回
+        bounds = [num_pages * i // num_workers for i in range(num_workers + 1)]
+        pool = self.get_pool(num_workers)
+        try:
+            shards = [pool.apply_async(extract_pages, (str(file), start, end))
+                      for start, end in zip(bounds[:-1], bounds[1:])]
+            return [page_text for shard in shards for page_text in wait_result(shard)]
+        except SplitCancelled:
+            # 不等待其他分片，直接结束子进程
+            self.terminate()
+            raise
+
+    @staticmethod
+    def count_pages(file: Path) -> int:
+        import pypdf
+        return len(pypdf.PdfReader(str(file)).pages)
+
+    def iter_page_texts(self, file: Path) -> Iterator[str]:
+        """
+        逐页产出本地 PDF 的文本，边提取边产出，不需要等整篇提取完成；缓存命中时直接产出缓存的文本。
+        strip_boilerplate 为 True 时，根据开头 BOILERPLATE_SAMPLE_PAGES 页判断页眉页脚，再从每一页中去除。
+        """
+        file = Path(file)
+        key = None
+        cached = None
+        if self.text_cache is not None:
+            key = self.text_cache.make_key(hash_file(str(file)), get_extraction_options())
+            cached = self.text_cache.get(key)
+        pages = iter(cached[0]) if cached is not None else self.iter_extracted_pages(file, key)
+        if not self.strip_boilerplate:
+            yield from pages
+            return
+        sample = list(islice(pages, BOILERPLATE_SAMPLE_PAGES))
+        repeated = find_repeated_edges(sample)
+        for page_text in chain(sample, pages):
+            if repeated:
+                page_text, removed = strip_page_edges(page_text, repeated)
+                record_suppressed(removed, 'boilerplate_lines', self.token_model)
+            yield page_text
+
+    def iter_extracted_pages(self, file: Path, key: Optional[str] = None) -> Iterator[str]:
+        """
+        按顺序逐页提取文本。并行时按 MIN_PAGES_PER_WORKER 页分段提交，最多 num_workers 段同时提取；
+        key 不为空时提取完成后写入缓存。
+        """
+        import pypdf
+        pdf = pypdf.PdfReader(str(file))
+        num_pages = len(pdf.pages)
+        num_workers = self.get_num_workers(num_pages)
+        page_texts = [] if key is not None else None
+        if num_workers <= 1:
+            for page in range(num_pages):
+                check_cancelled()
+                page_text = pdf.pages[page].extract_text()
+                if page_texts is not None:
+                    page_texts.append(page_text)
+                yield page_text
+        else:
+            bounds = list(range(0, num_pages, MIN_PAGES_PER_WORKER)) + [num_pages]
+            pool = self.get_pool(num_workers)
+            shards = deque()
+            try:
+                for start, end in zip(bounds[:-1], bounds[1:]):
+                    shards.append(pool.apply_async(extract_pages, (str(file), start, end)))
+                    while len(shards) >= num_workers or (shards and end == num_pages):
+                        for page_text in wait_result(shards.popleft()):
+                            if page_texts is not None:
+                                page_texts.append(page_text)
+                            yield page_text
+            except SplitCancelled:
+                self.terminate()
+                raise
+        if key is not None:
+            self.text_cache.put(key, page_texts, list(pdf.page_labels))
+
+    def read_pages(self, file: Path, fs: AbstractFileSystem,
+                   with_labels: bool) -> Tuple[List[str], Optional[List[str]]]:
+        """
+        解析 PDF，返回 (每页文本, 页码标签)；with_labels 为 False 时不计算页码标签。
+        """
         try:
             import pypdf
         except ImportError:
             raise ImportError(
                 "pypdf is required to read PDF files: `pip install pypdf`"
             )
-        fs = fs or get_default_fs()
         with fs.open(file, "rb") as fp:
             # Load the file in memory if the filesystem is not the default one to avoid
             # issues with pypdf
@@ -35,39 +178,58 @@ class Reader(PDFReader):
             # Create a PDF object
             pdf = pypdf.PdfReader(stream)
 
-            # Get the number of pages in the PDF document
-            num_pages = len(pdf.pages)
+            # 子进程按路径重新打开文件，只有默认文件系统才能并行提取
+            page_texts = self.extract_text(pdf, file, parallel=is_default_fs(fs))
+            return page_texts, list(pdf.page_labels) if with_labels else None
 
-            docs = []
+    def load_data(
+        self,
+        file: Path,
+        extra_info: Optional[Dict] = None,
+        fs: Optional[AbstractFileSystem] = None,
+    ) -> List[Document]:
+        """Parse file."""
+        if not isinstance(file, Path):
+            file = Path(file)
 
-            # This block returns a whole PDF as a single Document
-            if self.return_full_document:
-                metadata = {"file_name": file.name}
-                text = ""
+        fs = fs or get_default_fs()
+        key = None
+        cached = None
+        if self.text_cache is not None and is_default_fs(fs):
+            key = self.text_cache.make_key(hash_file(str(file)), get_extraction_options())
+            cached = self.text_cache.get(key)
+        if cached is not None:
+            page_texts, page_labels = cached
+        else:
+            # 写入缓存时总是带上页码标签，逐页返回时也能命中
+            page_texts, page_labels = self.read_pages(file, fs,
+                                                      with_labels=key is not None or not self.return_full_document)
+            if key is not None:
+                self.text_cache.put(key, page_texts, page_labels)
+
+        docs = []
+        if self.strip_boilerplate:
+            page_texts, removed = strip_page_boilerplate(page_texts)
+            record_suppressed(removed, 'boilerplate_lines', self.token_model)
+
+        # This block returns a whole PDF as a single Document
+        if self.return_full_document:
+            metadata = {"file_name": file.name}
+            if extra_info is not None:
+                metadata.update(extra_info)
+
+            # Join text extracted from each page
+            docs.append(Document(text="".join(page_texts), metadata=metadata))
+
+        # This block returns each page of a PDF as its own Document
+        else:
+            # Iterate over every page
+
+            for page_text, page_label in zip(page_texts, page_labels):
+                metadata = {"page_label": page_label, "file_name": file.name, "source": str(file.resolve())}
                 if extra_info is not None:
                     metadata.update(extra_info)
 
-                # Join text extracted from each page
-                for page in range(num_pages):
-                    # Extract the text from the page
-                    page_text = pdf.pages[page].extract_text()
-                    text += page_text
-
-                docs.append(Document(text=text, metadata=metadata))
-
-            # This block returns each page of a PDF as its own Document
-            else:
-                # Iterate over every page
-
-                for page in range(num_pages):
-                    # Extract the text from the page
-                    page_text = pdf.pages[page].extract_text()
-                    page_label = pdf.page_labels[page]
-
-                    metadata = {"page_label": page_label, "file_name": file.name, "source": str(file.resolve())}
-                    if extra_info is not None:
-                        metadata.update(extra_info)
-
-                    docs.append(Document(text=page_text, metadata=metadata))
+                docs.append(Document(text=page_text, metadata=metadata))
 
-            return docs
+        return docs
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from sqlite_cache import SQLiteCache
+
+# lru: 按最近访问时间淘汰；fifo: 按写入时间淘汰，适合只关心最近导入的文件的场景
+EVICTION_POLICIES = {
+    'lru': 'last_access',
+    'fifo': 'created',
+}
+
+
+class PDFTextCache(SQLiteCache):
+    """
+    基于 SQLite 的 PDF 文本提取缓存。
+
+    键为文件内容的 sha256 和提取选项，值为每页文本和页码标签的 JSON 经 zlib 压缩后的二进制。
+    PDF 没有修改时，重新导入或者用不同的分块参数重新切分都不需要再解析 PDF。
+    总大小超过 max_bytes 时按 eviction 策略淘汰；max_age 不为空时，写入时间超过 max_age 秒的记录读取时视为未命中，
+    并在读取到它或写入新记录时删除。
+    """
+
+    TABLE = 'pages'
+    SCHEMA = ("key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+              "created REAL NOT NULL, last_access REAL NOT NULL")
+    INDEXES = ('last_access', 'created')
+    EVICT_BATCH = 64
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, eviction: str = 'lru',
+                 max_age: Optional[float] = None):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"unsupported pdf cache eviction policy: {eviction}")
+        super().__init__(path, max_bytes)
+        self.eviction = eviction
+        self.max_age = max_age
+
+    @staticmethod
+    def make_key(content_hash: str, options: Dict[str, str]) -> str:
+        return hashlib.sha256(f"{content_hash}\0{json.dumps(options, sort_keys=True)}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        :return: (每页文本, 页码标签)，未命中时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT data, created FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age is not None and row[1] < now - self.max_age:
+                self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        data = json.loads(zlib.decompress(row[0]))
+        return data["pages"], data["labels"]
+
+    def put(self, key: str, pages: List[str], labels: List[str]) -> None:
+        data = zlib.compress(json.dumps({"pages": pages, "labels": labels}, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, data, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.max_age is not None:
+            self._conn.execute("DELETE FROM pages WHERE created < ?", (now - self.max_age,))
+        super()._evict(EVICTION_POLICIES[self.eviction])
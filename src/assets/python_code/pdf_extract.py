@@ -0,0 +1,10 @@
+from typing import List
+
+import pypdf
+
+# 提取文本的子进程只导入这个模块，spawn 启动方式（Windows、macOS 的默认方式）下不会在每个子进程中加载 llama_index
+
+
+def extract_pages(file: str, start: int, end: int) -> List[str]:
+    pdf = pypdf.PdfReader(file)
+    return [pdf.pages[page].extract_text() for page in range(start, end)]
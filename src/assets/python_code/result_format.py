@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from metrics import get_metrics
+
+COMPACT_FORMAT = 'compact-v1'
+RESULT_ENCODINGS = ['msgpack', 'json']
+
+
+def metadata_key(metadata: Dict) -> Any:
+    key = tuple(metadata.items())
+    try:
+        hash(key)
+    except TypeError:
+        # 值中有列表、字典等不可哈希的类型时按内容比较
+        return json.dumps(metadata, sort_keys=True, default=str)
+    return key
+
+
+def chunk_to_result(content: str, metadata: Dict, embedding: Optional[List[float]] = None) -> Dict:
+    chunk = {"pageContent": content, "metadata": metadata}
+    if embedding is not None:
+        chunk["embedding"] = embedding
+    return chunk
+
+
+def to_columns(result: List[Dict]) -> Dict:
+    """
+    把 [{pageContent, metadata}] 转换成列式结构，相同的 metadata 只保存一次：
+
+        {"format", "metadata": [去重后的 metadata], "pageContent": [...], "metadataIndex": [...]}
+
+    片段带有 embedding 时另外保存一列 "embedding"。
+    """
+    table: List[Dict] = []
+    indexes: Dict[Any, int] = {}
+    page_content: List[str] = []
+    metadata_index: List[int] = []
+    for chunk in result:
+        metadata = chunk["metadata"]
+        key = metadata_key(metadata)
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = len(table)
+            table.append(metadata)
+        page_content.append(chunk["pageContent"])
+        metadata_index.append(index)
+    columns = {"format": COMPACT_FORMAT, "metadata": table, "pageContent": page_content,
+               "metadataIndex": metadata_index}
+    if result and "embedding" in result[0]:
+        columns["embedding"] = [chunk["embedding"] for chunk in result]
+    return columns
+
+
+def from_columns(data: Dict) -> List[Dict]:
+    table = data["metadata"]
+    result = [{"pageContent": content, "metadata": table[index]}
+              for content, index in zip(data["pageContent"], data["metadataIndex"])]
+    if "embedding" in data:
+        for chunk, embedding in zip(result, data["embedding"]):
+            chunk["embedding"] = embedding
+    return result
+
+
+def encode(data: Dict, encoding: str = 'msgpack') -> bytes:
+    if encoding == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError(
+                "msgpack is required for the msgpack result encoding: `pip install msgpack`"
+            )
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode(payload: bytes, encoding: str = 'msgpack') -> Dict:
+    if encoding == 'msgpack':
+        import msgpack
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+
+def write_result_file(result: List[Dict], encoding: str = 'msgpack', directory: Optional[str] = None) -> Dict:
+    """
+    把切分结果以紧凑格式写入临时文件，socket 只传递文件引用，由接收方读取后删除文件：
+    Python 中用 read_result_file，Electron 主进程用 src/utils/result.ts 的 parseSplitResult（只支持 json 编码）。
+    """
+    with get_metrics().stage('serialize'):
+        payload = encode(to_columns(result), encoding)
+    fd, path = tempfile.mkstemp(prefix='split-', suffix=f'.{encoding}', dir=directory)
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(payload)
+    return {"format": COMPACT_FORMAT, "encoding": encoding, "result_file": path,
+            "chunks": len(result), "bytes": len(payload)}
+
+
+def read_result_file(reference: Dict, remove: bool = True) -> List[Dict]:
+    with open(reference["result_file"], 'rb') as fp:
+        data = decode(fp.read(), reference["encoding"])
+    if remove:
+        os.remove(reference["result_file"])
+    return from_columns(data)
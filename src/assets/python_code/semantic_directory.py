@@ -1,66 +1,104 @@
-import sys
 import asyncio
 import json
 import signal
 from argparse import ArgumentParser
-from pathlib import Path
 
-from utils import get_text_document, get_pdf_document, CODEReader, get_code_document
+from manifest import DirectoryManifest
+from cli import (add_embedding_arguments, add_journal_arguments, add_output_arguments, add_profile_arguments,
+                 add_walker_arguments, emit_cancelled, get_splitter_from_args, get_split_stats, import_deferred,
+                 open_journal, preload_modules, serialize_result)
+from cancellation import SplitCancelled, handle_sigterm, mark_finished, request_cancel
+from transport import emit_chunks
 import socketio
-from llama_index.core import SimpleDirectoryReader
 
 sio = socketio.AsyncClient()
 
 
 def signal_handler(sig, frame):
-    print('Interrupt signal received, exiting...')
-    sys.exit(0)
+    print('Interrupt signal received')
+    handle_sigterm()
 
 
 signal.signal(signal.SIGTERM, signal_handler)
 
 
 async def connect_handler():
-    input_files = SimpleDirectoryReader(
-        input_dir=args.path,
-        exclude_hidden=False,
-        recursive=True
-    ).input_files
-
-    files = [str(file.resolve()) for file in input_files]
-    result = []
-
-    for file in files:
-        if file.endswith(".txt"):
-            result.extend(get_text_document(path=file, embedding_api_key=args.embedding_api_key,
-                                            embedding_api_base=args.embedding_api_base, proxy=args.proxy))
-        if file.endswith(".pdf"):
-            result.extend(get_pdf_document(path=file, embedding_api_key=args.embedding_api_key,
-                                           embedding_api_base=args.embedding_api_base, proxy=args.proxy))
-        if CODEReader.is_supported(Path(file).suffix):
-            result.extend(get_code_document(path=file, embedding_api_key=args.embedding_api_key,
-                                            embedding_api_base=args.embedding_api_base, proxy=args.proxy))
-
     def ack_callback(response):
         print(response)
         asyncio.create_task(sio.disconnect())
 
-    await sio.emit('split_zip_result', json.dumps(result), callback=ack_callback)
+    # llama_index 导入较慢，启动时已经在后台加载，这里等待加载完成
+    await import_deferred('utils')
+    from utils import get_directory_document, iter_directory_document, sync_directory_document
+
+    splitter = get_splitter_from_args(args)
+    journal = open_journal(args, 'dir')
+    try:
+        # 切分在线程中执行，事件循环可以处理取消消息和信号
+        if args.incremental:
+            manifest = DirectoryManifest(args.manifest or DirectoryManifest.default_path(args.path))
+            result = await asyncio.to_thread(sync_directory_document, path=args.path,
+                                             embedding_api_key=args.embedding_api_key,
+                                             embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                             manifest=manifest, splitter=splitter, journal=journal)
+        elif args.stream:
+            batches = iter_directory_document(path=args.path, embedding_api_key=args.embedding_api_key,
+                                              embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                              splitter=splitter, journal=journal)
+            totals = await emit_chunks(sio, 'split_zip_result_chunk', batches, args.stream_batch_size)
+            stats = get_split_stats(splitter, args.profile, event='split_zip_result', path=args.path)
+            await sio.emit('split_stats', json.dumps(stats))
+            # 主进程收到结果后立即发送 SIGTERM，发送之前先结束进度日志
+            if journal is not None:
+                journal.complete()
+            mark_finished()
+            await sio.emit('split_zip_result', json.dumps(totals), callback=ack_callback)
+            return
+        else:
+            result = await asyncio.to_thread(get_directory_document, path=args.path,
+                                             embedding_api_key=args.embedding_api_key,
+                                             embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                             splitter=splitter, journal=journal)
+    except SplitCancelled:
+        await emit_cancelled(sio, splitter, journal, args.profile, event='split_zip_result',
+                             path=args.path)
+        return
+
+    payload = serialize_result(result, args.result_format, args.result_encoding, args.result_dir)
+    stats = get_split_stats(splitter, args.profile, event='split_zip_result', path=args.path)
+    await sio.emit('split_stats', json.dumps(stats))
+    # 主进程收到结果后立即发送 SIGTERM，发送之前先结束进度日志
+    if journal is not None:
+        journal.complete()
+    mark_finished()
+    await sio.emit('split_zip_result', payload, callback=ack_callback)
 
 @sio.event
 async def connect():
     await connect_handler()
 
 
+@sio.on('cancel')
+async def cancel(data=None):
+    request_cancel('cancel')
+    return 'Cancelling'
+
+
 async def main():
     print('start')
     parser = ArgumentParser()
     parser.add_argument("--path", required=True, help="path to zip")
-    parser.add_argument("--proxy", help="proxy address")
-    parser.add_argument("--embedding_api_key", required=True, help="embedding api key")
-    parser.add_argument("--embedding_api_base", default="https://api.openai.com/v1", help="embedding api base")
+    parser.add_argument("--incremental", action='store_true',
+                        help="only split files changed since the last run and report deleted files")
+    parser.add_argument("--manifest", help="manifest file used by --incremental, defaults to <path>.manifest.json")
+    add_embedding_arguments(parser)
+    add_output_arguments(parser)
+    add_walker_arguments(parser)
+    add_journal_arguments(parser)
+    add_profile_arguments(parser)
     global args
     args = parser.parse_args()
+    preload_modules('utils')
 
     await sio.connect('http://127.0.0.1:7765')
     await sio.wait()
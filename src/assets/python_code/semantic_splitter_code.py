@@ -1,20 +1,21 @@
-import sys
-
 import json
 import asyncio
 import signal
 from argparse import ArgumentParser
 from typing import List, TypedDict
 
-from utils import get_code_document
+from codeChunker import get_code_document
+from cli import (add_code_arguments, add_embedding_arguments, add_journal_arguments, add_walker_arguments,
+                 emit_cancelled, get_file_walker_from_args, open_journal)
+from cancellation import SplitCancelled, handle_sigterm, mark_finished, request_cancel
 import socketio
 
 sio = socketio.AsyncClient()
 
 
 def signal_handler(sig, frame):
-    print('Interrupt signal received, exiting...')
-    sys.exit(0)
+    print('Interrupt signal received')
+    handle_sigterm()
 
 
 signal.signal(signal.SIGTERM, signal_handler)
@@ -32,9 +33,21 @@ async def connect_handler():
         print(response)
         asyncio.create_task(sio.disconnect())
 
-    result = get_code_document(path=args.path, embedding_api_key=args.embedding_api_key,
-                               embedding_api_base=args.embedding_api_base, proxy=args.proxy)
-
+    journal = open_journal(args, 'code')
+    try:
+        # 切分在线程中执行，事件循环可以处理取消消息和信号
+        result = await asyncio.to_thread(get_code_document, path=args.path, embedding_api_key=args.embedding_api_key,
+                                         embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                         max_tokens=args.code_chunk_tokens, num_workers=args.code_workers,
+                                         journal=journal, file_walker=get_file_walker_from_args(args))
+    except SplitCancelled:
+        await emit_cancelled(sio, None, journal, event='split_code_result', path=args.path)
+        return
+
+    # 主进程收到结果后立即发送 SIGTERM，发送之前先结束进度日志
+    if journal is not None:
+        journal.complete()
+    mark_finished()
     await sio.emit('split_code_result', json.dumps(result), callback=ack_callback)
 
 
@@ -43,12 +56,19 @@ async def connect():
     await connect_handler()
 
 
+@sio.on('cancel')
+async def cancel(data=None):
+    request_cancel('cancel')
+    return 'Cancelling'
+
+
 async def main():
     parser = ArgumentParser()
     parser.add_argument("--path", required=True, help="path to code")
-    parser.add_argument("--proxy", help="proxy address")
-    parser.add_argument("--embedding_api_key", required=True, help="embedding api key")
-    parser.add_argument("--embedding_api_base", default="https://api.openai.com/v1", help="embedding api base")
+    add_embedding_arguments(parser)
+    add_code_arguments(parser)
+    add_walker_arguments(parser)
+    add_journal_arguments(parser)
     global args
     args = parser.parse_args()
 
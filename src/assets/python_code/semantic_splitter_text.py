@@ -1,33 +1,67 @@
-import sys
-
 import asyncio
 import json
 import signal
 from argparse import ArgumentParser
 
-from utils import get_text_document
+from cli import (add_embedding_arguments, add_journal_arguments, add_output_arguments, add_profile_arguments,
+                 add_walker_arguments, emit_cancelled, get_splitter_from_args, get_split_stats, import_deferred,
+                 open_journal, preload_modules, serialize_result)
+from cancellation import SplitCancelled, handle_sigterm, mark_finished, request_cancel
+from transport import emit_chunks
 import socketio
 
 sio = socketio.AsyncClient()
 
 
 def signal_handler(sig, frame):
-    print('Interrupt signal received, exiting...')
-    sys.exit(0)
+    print('Interrupt signal received')
+    handle_sigterm()
 
 
 signal.signal(signal.SIGTERM, signal_handler)
 
 
 async def connect_handler():
-    result = get_text_document(path=args.path, embedding_api_key=args.embedding_api_key,
-                               embedding_api_base=args.embedding_api_base, proxy=args.proxy)
-
     def ack_callback(response):
         print(response)
         asyncio.create_task(sio.disconnect())
 
-    await sio.emit('split_text_result', json.dumps(result), callback=ack_callback)
+    # llama_index 导入较慢，启动时已经在后台加载，这里等待加载完成
+    await import_deferred('utils')
+    from utils import get_text_document, iter_text_document
+
+    splitter = get_splitter_from_args(args)
+    journal = open_journal(args, 'text')
+    try:
+        if args.stream:
+            batches = iter_text_document(path=args.path, embedding_api_key=args.embedding_api_key,
+                                         embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                         splitter=splitter, journal=journal)
+            totals = await emit_chunks(sio, 'split_text_result_chunk', batches, args.stream_batch_size)
+            stats = get_split_stats(splitter, args.profile, event='split_text_result', path=args.path)
+            await sio.emit('split_stats', json.dumps(stats))
+            # 主进程收到结果后立即发送 SIGTERM，发送之前先结束进度日志
+            if journal is not None:
+                journal.complete()
+            mark_finished()
+            await sio.emit('split_text_result', json.dumps(totals), callback=ack_callback)
+            return
+        # 切分在线程中执行，事件循环可以处理取消消息和信号
+        result = await asyncio.to_thread(get_text_document, path=args.path, embedding_api_key=args.embedding_api_key,
+                                         embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                                         splitter=splitter, journal=journal)
+    except SplitCancelled:
+        await emit_cancelled(sio, splitter, journal, args.profile, event='split_text_result',
+                             path=args.path)
+        return
+    payload = serialize_result(result, args.result_format, args.result_encoding, args.result_dir)
+    stats = get_split_stats(splitter, args.profile, event='split_text_result', path=args.path)
+    await sio.emit('split_stats', json.dumps(stats))
+    # 主进程收到结果后立即发送 SIGTERM，发送之前先结束进度日志
+    if journal is not None:
+        journal.complete()
+    mark_finished()
+    await sio.emit('split_text_result', payload, callback=ack_callback)
 
 
 @sio.event
@@ -35,14 +69,23 @@ async def connect():
     await connect_handler()
 
 
+@sio.on('cancel')
+async def cancel(data=None):
+    request_cancel('cancel')
+    return 'Cancelling'
+
+
 async def main():
     parser = ArgumentParser()
     parser.add_argument("--path", required=True, help="path to text")
-    parser.add_argument("--proxy", help="proxy address")
-    parser.add_argument("--embedding_api_key", required=True, help="embedding api key")
-    parser.add_argument("--embedding_api_base", default="https://api.openai.com/v1", help="embedding api base")
+    add_embedding_arguments(parser)
+    add_output_arguments(parser)
+    add_walker_arguments(parser)
+    add_journal_arguments(parser)
+    add_profile_arguments(parser)
     global args
     args = parser.parse_args()
+    preload_modules('utils')
 
     await sio.connect('http://127.0.0.1:7765')
     await sio.wait()
@@ -0,0 +1,131 @@
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+Span = Tuple[int, int]
+
+# 合并后每个句子的最小长度
+MIN_SENTENCE_LENGTH = 50
+# 流式切分时单个句子的最大长度，没有标点的日志等文本在换行或空白处强制断开
+MAX_SENTENCE_LENGTH = 8192
+
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af'
+CLOSING_MARKS = '\'"’”)\\]'
+# 称谓后面总是接姓名，句点后面接大写单词也不是句子边界；区分大小写，只匹配首字母大写的写法
+TITLES = ['Mr', 'Mrs', 'Ms', 'Dr', 'Prof']
+# 其他缩写只有后面接小写单词或数字时才不是句子边界（Fig. 3、etc. and），"The answer was no. Then"
+# 这样的真实句末仍然切开；区分大小写，只匹配全小写和首字母大写的写法
+ABBREVIATIONS = [
+    'sr', 'jr', 'st', 'vs', 'etc', 'fig', 'figs', 'no', 'vol', 'eq', 'ch', 'sec', 'approx', 'dept', 'inc', 'ltd',
+    'co', 'corp', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'al', 'cf',
+    'ibid',
+]
+
+
+def word_lookbehinds(words: List[str], assertion: str) -> List[str]:
+    """把单词按长度分组，写成紧跟在句点之后的定长反向断言，assertion 为 '<!' 或 '<='。"""
+    return [
+        f'(?{assertion}\\b(?:{"|".join(word for word in words if len(word) == length)})\\.)'
+        for length in sorted({len(word) for word in words})
+    ]
+
+
+# 缩写检查只在遇到句点时才会执行
+NOT_ABBREVIATION = "".join(word_lookbehinds(TITLES, '<!')) + (
+    '(?!(?:' + "|".join(word_lookbehinds([form for word in ABBREVIATIONS for form in (word, word.capitalize())],
+                                         '<=')) + ')\\s+[a-z\\d])'
+) + (
+    # U.S.、e.g. 这类带内部句点的缩写；单个大写字母加句点（Plan B.）可能是句末，不排除
+    '(?<!\\.[^\\W\\d_]\\.)'
+)
+# 句子边界位于匹配的末尾，句末的空白归属前一个句子，因此所有句子首尾相接，拼起来就是原文。
+# 所有分支都以同一个字符集开头，正则引擎可以直接跳到候选字符，整个切分都在引擎中完成
+SENTENCE_BOUNDARY = re.compile(
+    '[.?!。！？\\n](?:'
+    # 西文问号、感叹号，后面必须跟空白
+    f'(?<=[?!])[.?!]*[{CLOSING_MARKS}]*\\s+'
+    # 中文里混用的半角问号、感叹号
+    f'|(?<=[?!])[?!]*(?=[{CJK_CHARS}])'
+    # 句点后面必须跟空白，避免切开 3.14、example.com；缩写后面通常接小写单词，也不切开
+    f'|(?<=\\.){NOT_ABBREVIATION}\\.*[{CLOSING_MARKS}]*\\s+(?=[^\\sa-z]|\\Z)'
+    # 中日韩句末标点，后面不需要空白
+    '|(?<=[。！？])[。！？]*[」』”’）》]*\\s*'
+    # 空行分段，没有标点的表格、代码也能分开
+    '|(?<=\\n)[ \\t]*\\n\\s*'
+    ')'
+)
+
+
+def segment_sentences(text: str) -> List[Span]:
+    """
+    一次扫描找出所有句子，返回 (start, end) 偏移，不复制任何文本。
+    """
+    bounds = [0, *map(re.Match.end, SENTENCE_BOUNDARY.finditer(text))]
+    if bounds[-1] < len(text):
+        bounds.append(len(text))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def merge_spans(spans: List[Span], min_length: int = MIN_SENTENCE_LENGTH,
+                length_function: Optional[Callable[[str], int]] = None, text: Optional[str] = None) -> List[Span]:
+    """
+    把相邻的短句合并到至少 min_length，只合并偏移，不拼接字符串。
+
+    :param length_function: 按 token 等其他单位计算长度时传入，此时需要同时传入 text，
+                            每个句子只取一次子串；默认直接用偏移计算字符数
+    """
+    merged: List[Span] = []
+    start = None
+    length = 0
+    for span_start, span_end in spans:
+        if start is None:
+            start, length = span_start, 0
+        if length_function is None:
+            length += span_end - span_start
+        else:
+            length += length_function(text[span_start:span_end])
+        if length >= min_length:
+            merged.append((start, span_end))
+            start = None
+    if start is not None:
+        merged.append((start, spans[-1][1]))
+    return merged
+
+
+def split_sentence_spans(text: str, min_length: int = MIN_SENTENCE_LENGTH) -> List[Span]:
+    return merge_spans(segment_sentences(text), min_length)
+
+
+def limit_span_length(text: str, spans: List[Span], max_length: int = MAX_SENTENCE_LENGTH) -> List[Span]:
+    """把超过 max_length 的句子优先在换行处、其次在空白处断开，都没有时直接截断。"""
+    limited: List[Span] = []
+    for start, end in spans:
+        while end - start > max_length:
+            limit = start + max_length
+            cut = text.rfind('\n', start + 1, limit)
+            if cut < 0:
+                cut = text.rfind(' ', start + 1, limit)
+            cut = cut + 1 if cut >= 0 else limit
+            limited.append((start, cut))
+            start = cut
+        limited.append((start, end))
+    return limited
+
+
+def iter_sentences(chunks: Iterable[str], min_length: int = MIN_SENTENCE_LENGTH,
+                   max_length: int = MAX_SENTENCE_LENGTH) -> Iterator[str]:
+    """
+    从文本块流中逐个产出句子，最后一个可能不完整的句子留到下一块再切分，
+    内存只与块大小和 max_length 有关。
+    """
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        spans = limit_span_length(buffer, merge_spans(segment_sentences(buffer), min_length), max_length)
+        if len(spans) < 2:
+            continue
+        for start, end in spans[:-1]:
+            yield buffer[start:end]
+        buffer = buffer[spans[-1][0]:]
+    if buffer:
+        for start, end in limit_span_length(buffer, merge_spans(segment_sentences(buffer), min_length), max_length):
+            yield buffer[start:end]
@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Sequence
+
+
+class SQLiteCache:
+    """
+    基于 SQLite 的持久化缓存的公共部分：WAL 模式的连接、命中统计，以及总大小超过 max_bytes 时的淘汰。
+
+    子类用 TABLE、SCHEMA 定义表结构，表中必须有 key 主键和 size 列；INDEXES 中的列会建立索引，用作淘汰顺序。
+    读写表时需要持有 _lock。
+    """
+    TABLE = ''
+    SCHEMA = ''
+    INDEXES: Sequence[str] = ('last_access',)
+    # 每次查询出来准备淘汰的记录数
+    EVICT_BATCH = 256
+
+    def __init__(self, path: str, max_bytes: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({self.SCHEMA})")
+        for column in self.INDEXES:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_{column} ON {self.TABLE} ({column})")
+        self._conn.commit()
+
+    def _evict(self, order: str = 'last_access') -> None:
+        """按 order 列从小到大删除记录，直到总大小不超过 max_bytes；调用方负责提交。"""
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.TABLE} ORDER BY {order} LIMIT {self.EVICT_BATCH}"
+            ).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                evicted.append((key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            self._conn.executemany(f"DELETE FROM {self.TABLE} WHERE key = ?", evicted)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,47 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import socketio
+
+from metrics import serialize
+
+
+async def iterate_in_thread(iterator: Iterator) -> AsyncIterator:
+    # 切分是同步阻塞的，逐项在线程中推进，事件循环可以在两次产出之间发送数据
+    sentinel = object()
+    while (item := await asyncio.to_thread(next, iterator, sentinel)) is not sentinel:
+        yield item
+
+
+async def emit_chunks(sio: socketio.AsyncClient, event: str, batches: Iterator[List[Dict]],
+                      batch_size: int = 0, extra: Optional[Dict] = None) -> Dict:
+    """
+    边切分边发送片段，每条消息带有递增的 seq。
+
+    :param batch_size: 每条消息的片段数，0 表示每个文档完成后发送一次
+    :return: 汇总信息，作为结束事件的内容
+    """
+    extra = extra or {}
+    seq = 0
+    total = 0
+    buffer: List[Dict] = []
+
+    async def flush(documents: List[Dict]):
+        nonlocal seq, total
+        await sio.emit(event, serialize({**extra, "seq": seq, "documents": documents}))
+        seq += 1
+        total += len(documents)
+
+    async for documents in iterate_in_thread(iter(batches)):
+        if batch_size <= 0:
+            if documents:
+                await flush(documents)
+            continue
+        buffer.extend(documents)
+        while len(buffer) >= batch_size:
+            await flush(buffer[:batch_size])
+            buffer = buffer[batch_size:]
+    if buffer:
+        await flush(buffer)
+
+    return {**extra, "done": True, "messages": seq, "chunks": total}
@@ -1,7 +1,7 @@
-import math
+# utils 中的分块器和读取器继承 llama_index 的类，导入 llama_index.core 时已经会加载 openai、httpx 和 numpy，
+# 这些依赖无法在本模块内推迟，入口脚本在连接之后才通过 cli.import_deferred 导入 utils
+from functools import partial
 
-import httpx
-import re
 from fsspec import AbstractFileSystem
 from pathlib import Path
 from llama_index.core.bridge.pydantic import Field
@@ -15,51 +15,124 @@ from llama_index.core.node_parser.node_utils import (
     build_nodes_from_splits
 )
 
-from typing import Any, Dict, List, Optional, Callable
-from typing import TypedDict, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Callable, Tuple
+from typing import Sequence
 from llama_index.core.schema import Document, BaseNode
-from concurrent.futures import ThreadPoolExecutor
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.core.readers.base import BaseReader
-from llama_index.core.readers.file.base import get_default_fs, is_default_fs
-from llama_index.core.schema import Document
-
-from typing import List
-
-# import tree_sitter_python as tspython
-# import tree_sitter_php as tsphp
-# import tree_sitter_javascript as tsjavascript
-# import tree_sitter_typescript as tstypescript
-# import tree_sitter_go as tsgo
-# import tree_sitter_cpp as tscpp
-# import tree_sitter_java as tsjava
-# import tree_sitter_ruby as tsruby
-# import tree_sitter_c_sharp as tscs
-# from tree_sitter import Language, Parser
-import tiktoken
+from llama_index.core.readers.file.base import default_file_metadata_func, get_default_fs
+
 from llama_index.core import SimpleDirectoryReader
 from pdfReader import Reader
+from codeChunker import get_code_document, is_code_file, iter_code_documents
+from dedup import BlockDeduplicator, record_suppressed
+from journal import SplitJournal, iter_journaled
+from file_walker import FileWalker
 from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core.utils import get_tqdm_iterable
+from embedding_cache import EmbeddingCache
+from pdf_cache import PDFTextCache
+from cancellation import check_cancelled
+from batch_planner import EmbeddingBatchPlanner, get_model_limits, get_tokenizer
+from embedding_scheduler import get_embedding_scheduler
+from local_embedding import LocalEmbedding
+from manifest import DirectoryManifest
+from metrics import get_metrics
+from result_format import chunk_to_result
+from sentence_segmenter import iter_sentences, split_sentence_spans
+from normalizer import TextNormalizer
+from chunking import (bound_chunk_sizes, build_node_chunks, build_sentence_groups, calculate_cosine_distances,
+                      calculate_threshold, chunk_bounds, get_breakpoint_scores, pool_embeddings, ScoreHistory)
+
+__all__ = [
+    # 切分入口和读取器
+    'BaseSentenceSplitter', 'TXTReader', 'get_embed_model', 'get_splitter', 'request_embeddings',
+    'arequest_embeddings', 'split_by_sentence_tokenizer', 'remove_space_between_english_and_chinese',
+    'get_current_directory', 'nodes_to_result', 'get_file_walker', 'walk_files', 'list_directory_files',
+    'get_pdf_document', 'iter_pdf_document', 'get_text_document', 'iter_text_document',
+    'get_directory_document', 'iter_directory_document', 'sync_directory_document',
+    # 从拆分出去的模块重新导出，保持原来 from utils import 的写法可用
+    'calculate_threshold', 'build_node_chunks', 'build_sentence_groups', 'calculate_cosine_distances',
+    'get_code_document', 'get_tokenizer',
+]
+
+EMBEDDING_CONCURRENCY = 5
+# 超过这个大小的文本文件按窗口流式切分，不再整个读入内存
+STREAM_TEXT_THRESHOLD = 64 * 1024 * 1024
+# 超过这个页数的 PDF 逐页提取，按窗口流式切分，不再整篇提取和嵌入
+STREAM_PDF_PAGES = 256
+# 逐页提取的 PDF 每积累这么多字符就开始规范化和切句，不等待整个规范化窗口
+STREAM_PDF_WINDOW = 64 * 1024
+# 流式切分时每次做语义断点检测的句子数
+STREAM_WINDOW_SENTENCES = 1024
+# 流式读取文本文件时每次读取的字符数
+STREAM_READ_SIZE = 1 << 20
+# 多个文件一起切分时，每批文件的总大小上限，同一批文件的句子组一起规划嵌入请求
+FILE_PACK_BYTES = 8 * 1024 * 1024
+DEFAULT_TEXT_NORMALIZER = TextNormalizer()
+
+
+def get_embed_model(embedding_api_key: str, embedding_api_base: str, proxy: str) -> OpenAIEmbedding:
+    import httpx
+    # 重试由 EmbeddingScheduler 统一负责，客户端本身不再重试
+    embed_model = OpenAIEmbedding(
+        api_key=embedding_api_key,
+        api_base=embedding_api_base,
+        max_retries=0,
+        http_client=httpx.Client(proxies={"http://": proxy, "https://": proxy}),
+        async_http_client=httpx.AsyncClient(proxies={"http://": proxy, "https://": proxy})
+    )
+    # 批次由 EmbeddingBatchPlanner 规划，不再让 llama_index 按默认的 10 条再拆分
+    embed_model.embed_batch_size = get_model_limits(embed_model.model_name)["max_inputs"]
+    return embed_model
 
 
-def split_by_sentence_tokenizer(text: str, metadata: Optional[Dict]) -> list[str]:
-    # 使用正则表达式拆分文本
-    sentences = re.split('(?<=[.。?？!！])\\s+', text)
-    merged_sentences = []
-    current_sentence = ''
+def get_splitter(embed_model: BaseEmbedding, **kwargs: Any) -> "BaseSentenceSplitter":
+    return BaseSentenceSplitter(
+        buffer_size=1,
+        embed_model=embed_model,
+        sentence_splitter=split_by_sentence_tokenizer,
+        breakpoint_percentile_threshold=80,
+        **kwargs
+    )
 
-    for sentence in sentences:
-        if len(current_sentence + sentence) < 50:
-            current_sentence += sentence
-        else:
-            merged_sentences.append(current_sentence + sentence)
-            current_sentence = ''
 
-    # 确保最后一个句子也被添加
-    if current_sentence:
-        merged_sentences.append(current_sentence)
+def request_embeddings(embed_model: BaseEmbedding, texts: List[str]) -> List[List[float]]:
+    """
+    发送一次嵌入请求。OpenAIEmbedding 直接调用客户端，绕过 llama_index 内置的重试，
+    让调度器看到原始的 429/5xx 错误。其他模型直接调用 _get_text_embeddings，
+    不经过 get_text_embedding_batch 的回调事件，事件模型会逐个校验返回的浮点数。
+    """
+    with get_metrics().stage('embedding_request'):
+        if isinstance(embed_model, OpenAIEmbedding):
+            data = embed_model._get_client().embeddings.create(
+                input=[text.replace("\n", " ") for text in texts],
+                model=embed_model._text_engine,
+                **embed_model.additional_kwargs
+            ).data
+            return [d.embedding for d in data]
+        return embed_model._get_text_embeddings(texts)
+
+
+async def arequest_embeddings(embed_model: OpenAIEmbedding, texts: List[str]) -> List[List[float]]:
+    """
+    request_embeddings 的异步版本，在调度器的事件循环中执行。任务被取消时 httpx 立即关闭连接，
+    正在等待响应的请求随之中断，不会在后台继续占用额度。
+    """
+    with get_metrics().stage('embedding_request'):
+        response = await embed_model._get_aclient().embeddings.create(
+            input=[text.replace("\n", " ") for text in texts],
+            model=embed_model._text_engine,
+            **embed_model.additional_kwargs
+        )
+        return [d.embedding for d in response.data]
+
 
-    return merged_sentences
+def split_by_sentence_tokenizer(text: str, metadata: Optional[Dict]) -> list[str]:
+    """
+    按中西文句末标点和空行切分，相邻短句合并到至少 MIN_SENTENCE_LENGTH 个字符。
+    切分只计算偏移，最后才取出句子文本；句子首尾相接，拼起来就是原文。
+    """
+    return [text[start:end] for start, end in split_sentence_spans(text)]
 
 
 def remove_space_between_english_and_chinese(text):
@@ -69,19 +142,7 @@ def remove_space_between_english_and_chinese(text):
     :param text: 输入的文本字符串
     :return: 去除空格后的文本字符串
     """
-    # 匹配中文字符
-    chinese_chars = r'[\u4e00-\u9fff]'
-    # 匹配英文字符
-    english_chars = r'[a-zA-Z]'
-
-    # 匹配模式：中文 + 单个空格 + 英文 或 英文 + 单个空格 + 中文
-    pattern = re.compile(f'({chinese_chars}) (\\w)|({english_chars}) ({chinese_chars})')
-
-    # 去除空格：将匹配到的模式中的空格去除
-    result = pattern.sub(
-        lambda match: match.group(1) + match.group(2) if match.group(1) else match.group(3) + match.group(4), text)
-
-    return result
+    return DEFAULT_TEXT_NORMALIZER.normalize(text)
 
 
 def get_current_directory():
@@ -90,117 +151,213 @@ def get_current_directory():
     return current_directory
 
 
-def calculate_threshold(slope_changes, factor):
-    """
-    根据给定的因子计算阈值。
-
-    :param slope_changes: 斜率变化量的数组
-    :param factor: 0到1之间的值，用于调节阈值的大小
-    :return: 计算出的阈值
-    """
-    mean_change = np.mean(slope_changes)
-    std_change = np.std(slope_changes)
-    threshold = mean_change + factor * std_change
-    return threshold
-
-
-def build_node_chunks(sentences: List[str], distances: List[float], breakpoint_percentile_threshold) -> List[str]:
-    chunks = []
-    if len(distances) > 0:
-        breakpoint_distance_threshold = np.percentile(
-            distances, breakpoint_percentile_threshold
-        )
-
-        indices_above_threshold = [
-            i for i, x in enumerate(distances) if x > breakpoint_distance_threshold
-        ]
-
-        # Chunk sentences into semantic groups based on percentile breakpoints
-        start_index = 0
-
-        for index in indices_above_threshold:
-            group = sentences[start_index: index + 1]
-            combined_text = "".join([d for d in group])
-            chunks.append(combined_text)
-
-            start_index = index + 1
-
-        if start_index < len(sentences):
-            combined_text = "".join(
-                [d for d in sentences[start_index:]]
-            )
-            chunks.append(combined_text)
-    else:
-        # If, for some reason we didn't get any distances (i.e. very, very small documents) just
-        # treat the whole document as a single node
-        chunks = [" ".join([s for s in sentences])]
-
-    return chunks
-
-
-class SentenceCombination(TypedDict):
-    sentence: str
-    index: int
-    combined_sentence: str
-    combined_sentence_embedding: List[float]
-
-
 class BaseSentenceSplitter(SemanticSplitterNodeParser):
     sentence_splitter: Callable[[str, Optional[Dict]], List[str]] = Field(
         description="The text splitter to use when splitting documents.",
         exclude=True,
     )
+    embedding_cache: Optional[EmbeddingCache] = Field(
+        default=None,
+        description="Persistent cache consulted before requesting embeddings.",
+        exclude=True,
+    )
+    pdf_cache: Optional[PDFTextCache] = Field(
+        default=None,
+        description="Persistent cache of extracted PDF page text, keyed by file content.",
+        exclude=True,
+    )
+    file_walker: Optional[FileWalker] = Field(
+        default=None,
+        description="Lists the files to split, None uses the default ignore rules and limits.",
+        exclude=True,
+    )
+    batch_planner: Optional[EmbeddingBatchPlanner] = Field(
+        default=None,
+        description="Plans embedding requests within the model's token and input limits.",
+        exclude=True,
+    )
+    text_normalizer: TextNormalizer = Field(
+        default=DEFAULT_TEXT_NORMALIZER,
+        description="Normalization applied to document text before splitting.",
+        exclude=True,
+    )
+    stream_threshold: int = Field(
+        default=STREAM_TEXT_THRESHOLD,
+        description="Text files larger than this many bytes are split in streaming mode.",
+    )
+    stream_window: int = Field(
+        default=STREAM_WINDOW_SENTENCES,
+        description="Number of sentences per breakpoint detection window in streaming mode.",
+    )
+    chunk_embedding: Optional[str] = Field(
+        default=None,
+        description="Return an embedding with every chunk: 'pooled' or 'exact', None disables it.",
+    )
+    breakpoint_strategy: str = Field(
+        default='percentile',
+        description="How breakpoints are found: 'percentile', 'standard_deviation' or 'gradient'.",
+    )
+    breakpoint_factor: float = Field(
+        default=1.0,
+        description="Number of standard deviations above the mean for the standard_deviation and gradient strategies.",
+    )
+    min_chunk_tokens: int = Field(
+        default=0,
+        description="Chunks smaller than this many tokens are merged with their neighbours.",
+    )
+    max_chunk_tokens: Optional[int] = Field(
+        default=None,
+        description="Chunks are cut before they grow beyond this many tokens, None disables the limit.",
+    )
+    deduplicate: bool = Field(
+        default=False,
+        description="Strip repeated PDF headers/footers and text blocks already seen in earlier files.",
+    )
 
     def __init__(self, **kwargs):
+        if kwargs.get('batch_planner') is None and kwargs.get('embed_model') is not None:
+            kwargs['batch_planner'] = EmbeddingBatchPlanner(model=kwargs['embed_model'].model_name,
+                                                            concurrency=EMBEDDING_CONCURRENCY)
         super().__init__(**kwargs)
         # self.sentence_splitter = sentence_splitter
 
     def _get_batch(self, texts: List[str]) -> List[List[str]]:
-        enc = tiktoken.encoding_for_model('text-embedding-ada-002')
-        cur_chunk: List[str] = []
-        cur_chunk_count = 0
-        batches: List[List[str]] = []
-        for text in texts:
-            tokens = enc.encode(text)
-            token_count = len(tokens)
-            if token_count + cur_chunk_count > 8191:
-                batches.append(cur_chunk)
-                cur_chunk_count = token_count
-                cur_chunk = [text]
-            else:
-                cur_chunk_count += token_count
-                cur_chunk.append(text)
-        if len(cur_chunk) > 0:
-            batches.append(cur_chunk)
-        return batches
-
-    def _build_node_chunks(
-            self, sentences: List[SentenceCombination], distances: List[float]
-    ) -> List[str]:
-        return build_node_chunks(
-            [s['sentence'] for s in sentences],
-            distances,
-            self.breakpoint_percentile_threshold
+        return self.batch_planner.plan(texts)
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        check_cancelled()
+        if isinstance(self.embed_model, LocalEmbedding):
+            # 本地嵌入没有网络开销和额度限制，不需要规划批次和调度
+            return request_embeddings(self.embed_model, texts)
+        # 所有文档的批次都交给进程级调度器，统一控制并发、额度和重试
+        metrics = get_metrics()
+        with metrics.stage('tokenize'):
+            planned = self.batch_planner.plan_with_tokens(texts)
+        metrics.count('tokens', sum(token_count for _, token_count in planned))
+        metrics.count('requests', len(planned))
+        request = arequest_embeddings if isinstance(self.embed_model, OpenAIEmbedding) else request_embeddings
+        return get_embedding_scheduler().embed(
+            partial(request, self.embed_model),
+            [batch for batch, _ in planned],
+            [token_count for _, token_count in planned]
         )
 
-    def semantic_sentence_combination(self, texts: List[str]) -> List[str]:
-        sentences = self._build_sentence_groups(texts)
-
-        batches = self._get_batch([s["combined_sentence"] for s in sentences])
-        combined_sentence_embeddings = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            embeddings = list(executor.map(lambda batch: self.embed_model.get_text_embedding_batch(batch), batches))
-            for batch in embeddings:
-                for embedding in batch:
-                    combined_sentence_embeddings.append(embedding)
+    def get_token_model(self) -> Optional[str]:
+        """统计 token 数使用的模型，本地嵌入不按 token 计费，返回 None。"""
+        return None if isinstance(self.embed_model, LocalEmbedding) else self.embed_model.model_name
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # 相同的句子组只请求一次，再按位置展开
+        index = {}
+        positions = [index.setdefault(text, len(index)) for text in texts]
+        if len(index) == len(texts):
+            return self._get_unique_embeddings(texts)
+        unique_texts = list(index)
+        counts = np.bincount(positions)
+        record_suppressed([text for text, count in zip(unique_texts, counts) for _ in range(count - 1)],
+                          'duplicate_groups', self.get_token_model())
+        return self._get_unique_embeddings(unique_texts)[positions]
+
+    def _get_unique_embeddings(self, texts: List[str]) -> np.ndarray:
+        if self.embedding_cache is None:
+            return np.asarray(self._embed_texts(texts), dtype=np.float32)
+
+        namespace = f"{self.embed_model.model_name}|{getattr(self.embed_model, 'api_base', '')}"
+        cached = self.embedding_cache.get_many(namespace, texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        missing_embeddings = None
+        if missing:
+            # 只有未命中的文本才会请求嵌入接口
+            missing_texts = [texts[i] for i in missing]
+            missing_embeddings = np.asarray(self._embed_texts(missing_texts), dtype=np.float32)
+            self.embedding_cache.put_many(namespace, missing_texts, missing_embeddings)
+
+        dim = len(missing_embeddings[0]) if missing else len(cached[0])
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+        if missing:
+            embeddings[missing] = missing_embeddings
+        return embeddings
 
-        for i, embedding in enumerate(combined_sentence_embeddings):
-            sentences[i]["combined_sentence_embedding"] = embedding
-
-        distances = self._calculate_distances_between_sentence_groups(sentences)
-
-        chunks = self._build_node_chunks(sentences, distances)
-        return chunks
+    def semantic_sentence_combination(self, texts: List[str]) -> List[str]:
+        return self.semantic_chunks(texts)[0]
+
+    def semantic_chunks(self, texts: List[str]) -> Tuple[List[str], Optional[np.ndarray]]:
+        """
+        :return: (片段, 片段嵌入)，没有开启 chunk_embedding 时片段嵌入为 None
+        """
+        return self.semantic_chunks_many([texts])[0]
+
+    def semantic_chunks_many(self, texts_list: List[List[str]]) -> List[Tuple[List[str], Optional[np.ndarray]]]:
+        """
+        多个文档的句子组合并在一起规划嵌入请求，小文件不再各自发送零碎的请求，断点仍在每个文档内部计算。
+
+        :return: 每个文档的 (片段, 片段嵌入)
+        """
+        # 句子和句子组以并列数组保存，嵌入保存在一个连续的 float32 矩阵中
+        metrics = get_metrics()
+        groups = [build_sentence_groups(texts, self.buffer_size) for texts in texts_list]
+        with metrics.stage('embed'):
+            embeddings = self._get_embeddings([group for document_groups in groups for group in document_groups])
+        offsets = np.cumsum([0, *map(len, groups)])
+
+        documents = []
+        for texts, start, end in zip(texts_list, offsets[:-1], offsets[1:]):
+            document_embeddings = embeddings[start:end]
+            with metrics.stage('distances'):
+                distances = calculate_cosine_distances(document_embeddings)
+            with metrics.stage('chunks'):
+                bounds = self._build_chunk_bounds(texts, distances)
+                chunks = ["".join(texts[start:end]) for start, end in bounds]
+            metrics.count('chunks', len(chunks))
+            documents.append((texts, document_embeddings, chunks, bounds))
+
+        if self.chunk_embedding != 'exact':
+            return [(chunks, self._get_chunk_embeddings(chunks, texts, document_embeddings, bounds))
+                    for texts, document_embeddings, chunks, bounds in documents]
+        # 所有文档的片段也合并成一次请求
+        with metrics.stage('chunk_embed'):
+            chunk_embeddings = self._get_embeddings([chunk for texts, _, chunks, _ in documents if texts
+                                                     for chunk in chunks])
+        results = []
+        offset = 0
+        for texts, _, chunks, _ in documents:
+            if not texts:
+                results.append((chunks, None))
+                continue
+            results.append((chunks, chunk_embeddings[offset:offset + len(chunks)]))
+            offset += len(chunks)
+        return results
+
+    def _build_chunk_bounds(self, sentences: List[str], distances: np.ndarray,
+                            history: Optional[ScoreHistory] = None) -> List[Tuple[int, int]]:
+        if len(distances) == 0:
+            return [(0, len(sentences))]
+        scores, threshold = get_breakpoint_scores(distances, self.breakpoint_strategy,
+                                                  self.breakpoint_percentile_threshold, self.breakpoint_factor,
+                                                  history)
+        breaks = scores > threshold
+        if not self.min_chunk_tokens and self.max_chunk_tokens is None:
+            return chunk_bounds(len(sentences), (np.flatnonzero(breaks) + 1).tolist())
+        # 只有限制片段大小时才需要每个句子的 token 数
+        with get_metrics().stage('tokenize'):
+            _, token_counts = self.batch_planner.count_tokens(sentences)
+        return bound_chunk_sizes(token_counts, breaks.tolist(), scores.tolist(),
+                                 self.min_chunk_tokens, self.max_chunk_tokens)
+
+    def _get_chunk_embeddings(self, chunks: List[str], sentences: List[str], embeddings: np.ndarray,
+                              bounds: List[Tuple[int, int]]) -> Optional[np.ndarray]:
+        if self.chunk_embedding is None or not sentences:
+            return None
+        with get_metrics().stage('chunk_embed'):
+            if self.chunk_embedding == 'exact':
+                # 片段一起规划批次，经过缓存和调度器，与句子组嵌入使用同一个客户端
+                return self._get_embeddings(chunks)
+            return pool_embeddings(embeddings, sentences, bounds)
 
     def _parse_nodes(
             self,
@@ -208,40 +365,105 @@ class BaseSentenceSplitter(SemanticSplitterNodeParser):
             show_progress: bool = False,
             **kwargs: Any,
     ) -> List[BaseNode]:
-        """Parse document into nodes."""
+        """
+        llama_index 的 get_nodes_from_documents 入口，与读取器使用同一条路径：所有文档一起切分，共用一次嵌入规划。
+        """
         all_nodes: List[BaseNode] = []
-        nodes_with_progress = get_tqdm_iterable(nodes, show_progress, "Parsing nodes")
-
-        def process_node(node):
-            return self.build_semantic_nodes_from_document(node, show_progress)
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            # Use executor.map to process nodes concurrently
-            results = list(executor.map(process_node, nodes_with_progress))
-
-            # Flatten the results and extend all_nodes
-            for nodes in results:
-                all_nodes.extend(nodes)
-
+        for document_nodes in self.build_semantic_nodes_from_documents(nodes):
+            all_nodes.extend(document_nodes)
         return all_nodes
 
+    def iter_semantic_chunks(self, sentences: Iterable[str]) -> Iterator[Tuple[List[str], Optional[np.ndarray]]]:
+        """
+        流式语义切分：在 stream_window 个句子的滑动窗口内计算断点，每个窗口产出已经确定的片段及其嵌入。
+
+        窗口最后一个断点之后的句子还可能与后面的句子属于同一片段，留到下一个窗口，
+        其中句子组已经完整的嵌入直接复用；前一个片段末尾的 buffer_size 个句子作为上下文，
+        保证句子组与整篇切分时一致。
+        """
+        window = max(self.stream_window, 2 * self.buffer_size + 2)
+        context: List[str] = []
+        pending: List[str] = []
+        known = np.empty((0, 0), dtype=np.float32)
+        history = ScoreHistory()
+        for sentence in sentences:
+            pending.append(sentence)
+            if len(pending) < window:
+                continue
+            get_metrics().count('sentences', window - len(known))
+            chunks, chunk_embeddings, context, pending, known = self._split_window(context, pending, known, history)
+            if chunks:
+                yield chunks, chunk_embeddings
+        if pending:
+            get_metrics().count('sentences', len(pending) - len(known))
+            chunks, chunk_embeddings, _, _, _ = self._split_window(context, pending, known, history, final=True)
+            yield chunks, chunk_embeddings
+
+    def _split_window(self, context: List[str], pending: List[str], known: np.ndarray, history: ScoreHistory,
+                      final: bool = False):
+        check_cancelled()
+        metrics = get_metrics()
+        groups = build_sentence_groups(context + pending, self.buffer_size)[len(context):]
+        with metrics.stage('embed'):
+            embeddings = self._get_embeddings(groups[len(known):])
+            if len(known):
+                embeddings = np.concatenate([known, embeddings]) if len(embeddings) else known
+        with metrics.stage('distances'):
+            distances = calculate_cosine_distances(embeddings)
+        with metrics.stage('chunks'):
+            if final:
+                bounds = self._build_chunk_bounds(pending, distances, history)
+                chunks = ["".join(pending[start:end]) for start, end in bounds]
+                metrics.count('chunks', len(chunks))
+                return chunks, self._get_chunk_embeddings(chunks, pending, embeddings, bounds), [], [], known[:0]
+            # 最后 buffer_size 个句子组还缺少后面的句子，涉及它们的距离不参与本窗口的断点检测
+            limit = len(pending) - self.buffer_size
+            bounds = self._build_chunk_bounds(pending[:limit], distances[:limit - 1], history)
+            # 最后一个片段可能与后面的句子属于同一片段，留到下一个窗口；
+            # 只有一个片段时强制在可确定的位置断开，保证窗口不会无限增长
+            if len(bounds) > 1:
+                bounds = bounds[:-1]
+            cut = bounds[-1][1]
+            chunks = ["".join(pending[start:end]) for start, end in bounds]
+            # 断开位置之前的距离不会再重新计算，计入历史得分
+            history.add(get_breakpoint_scores(distances[:limit - 1], self.breakpoint_strategy)[0][:cut])
+        metrics.count('chunks', len(chunks))
+        chunk_embeddings = self._get_chunk_embeddings(chunks, pending[:cut], embeddings[:cut], bounds)
+        # 留下的句子中，句子组已经完整的嵌入可以复用
+        return (chunks, chunk_embeddings, pending[max(0, cut - self.buffer_size):cut], pending[cut:],
+                embeddings[cut:len(pending) - self.buffer_size])
+
     def build_semantic_nodes_from_document(
             self,
             document: Document,
             show_progress: bool = False,
     ) -> List[BaseNode]:
         """Build window nodes from documents."""
-        text = document.text
-        text_splits = self.sentence_splitter(text, document.metadata)
-
-        chunks = self.semantic_sentence_combination(text_splits)
-        nodes = build_nodes_from_splits(
-            chunks,
-            document,
-            id_func=self.id_func,
-        )
+        return self.build_semantic_nodes_from_documents([document])[0]
+
+    def build_semantic_nodes_from_documents(self, documents: Sequence[Document]) -> List[List[BaseNode]]:
+        """
+        一起切分多个文档，所有文档的句子组共用一次嵌入规划。
+
+        :return: 每个文档的节点
+        """
+        with get_metrics().stage('sentence_split'):
+            text_splits = [self.sentence_splitter(document.text, document.metadata) for document in documents]
+        get_metrics().count('sentences', sum(map(len, text_splits)))
+
+        results = []
+        for document, (chunks, chunk_embeddings) in zip(documents, self.semantic_chunks_many(text_splits)):
+            nodes = build_nodes_from_splits(
+                chunks,
+                document,
+                id_func=self.id_func,
+            )
+            if chunk_embeddings is not None:
+                for node, embedding in zip(nodes, chunk_embeddings):
+                    node.embedding = embedding.tolist()
+            results.append(nodes)
 
-        return nodes
+        return results
 
 
 class TXTReader(BaseReader):
@@ -270,242 +492,316 @@ class TXTReader(BaseReader):
 
             return [doc]
 
+    @staticmethod
+    def iter_windows(file: Path, window_size: int = STREAM_READ_SIZE) -> Iterator[str]:
+        """按固定字符数分块读取，不把整个文件读入内存。"""
+        with open(file, "r", encoding='utf-8') as fp:
+            while chunk := fp.read(window_size):
+                yield chunk
 
-# class CODEReader(BaseReader):
-#     @staticmethod
-#     def is_supported(suffix: str) -> bool:
-#         return suffix in ['.py', '.php', '.js', '.ts', '.go', '.cpp', '.java', '.rb', '.cs']
-#
-#     @staticmethod
-#     def get_parser(suffix: str):
-#         if suffix is None:
-#             return None
-#         parser_dict = {
-#             '.py': Language(tspython.language()),
-#             '.php': Language(tsphp.language_php()),
-#             '.js': Language(tsjavascript.language()),
-#             '.ts': Language(tstypescript.language_typescript()),
-#             '.go': Language(tsgo.language()),
-#             '.cpp': Language(tscpp.language()),
-#             '.java': Language(tsjava.language()),
-#             '.rb': Language(tsruby.language()),
-#             '.cs': Language(tscs.language())
-#         }
-#         if not suffix.startswith('.'):
-#             suffix = '.' + suffix
-#         language = parser_dict[suffix]
-#         if language is None:
-#             return None
-#         parser = Parser()
-#         parser.set_language(language)
-#         return parser
-#
-#     @staticmethod
-#     def extract_top_level_nodes(source_code, suffix):
-#         parser = CODEReader.get_parser(suffix)
-#         if parser is not None:
-#             tree = parser.parse(bytes(source_code, 'utf8'))
-#             root_node = tree.root_node
-#             top_level_nodes = []
-#
-#             # 遍历根节点的直接子节点
-#             for child in root_node.children:
-#                 # 提取每个顶层节点的文本内容
-#                 start_byte = child.start_byte
-#                 end_byte = child.end_byte
-#                 node_text = source_code[start_byte:end_byte]
-#                 top_level_nodes.append(node_text)
-#
-#             return top_level_nodes
-#         return []
-#
-#     @staticmethod
-#     def split_by_ast(source_code, suffix):
-#         parser = CODEReader.get_parser(suffix)
-#         if parser is not None:
-#             tree = parser.parse(bytes(source_code, 'utf8'))
-#             root_node = tree.root_node
-#             top_level_nodes = []
-#
-#         return []
-#
-#     def load_data(
-#             self,
-#             file: Path,
-#             extra_info: Optional[Dict] = None,
-#             fs: Optional[AbstractFileSystem] = None,
-#     ) -> List[Document]:
-#         """Parse file."""
-#         if not isinstance(file, Path):
-#             file = Path(file)
-#
-#         fs = fs or get_default_fs()
-#         with fs.open(file, "r", encoding='utf-8') as fp:
-#             # Read the entire file content
-#             content = fp.read()
-#
-#             # Create metadata dictionary
-#             metadata = {"file_name": file.name, "suffix": file.suffix.lower(), "source": str(file.resolve())}
-#             if extra_info is not None:
-#                 metadata.update(extra_info)
-#
-#             # Create a single Document with the entire file content
-#             doc = Document(text=content, metadata=metadata)
-#
-#             return [doc]
-#
-#     @staticmethod
-#     def split_code_by_token(code: str, suffix) -> List[str]:
-#         max_tokens = 8191
-#         # models = {
-#         #     'text-embedding-3-large': 8191,
-#         #     'text-embedding-ada-002': 8191,
-#         #     'text-embedding-3-small': 8191
-#         # }
-#         enc = tiktoken.encoding_for_model('text-embedding-ada-002')
-#         tokens = enc.encode(code)
-#         chunks = []
-#         start = 0
-#         parser = CODEReader.get_parser(suffix)
-#         if parser is not None:
-#             while start < len(tokens):
-#                 end = start + max_tokens
-#                 chunk_tokens = tokens[start:end]
-#                 chunk_text = enc.decode(chunk_tokens)
-#                 chunks.append(chunk_text)
-#                 start = end
-#
-#         return chunks
-
-
-def get_pdf_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str) -> List[Document]:
-    input_files = None
-    input_dir = None
-    if Path(path).is_file():
-        input_files = [path]
-    if Path(path).is_dir():
-        input_dir = path
-    documents = SimpleDirectoryReader(
-        exclude_hidden=False,
-        recursive=True,
-        input_files=input_files,
-        input_dir=input_dir,
-        file_extractor={
-            ".pdf": Reader(return_full_document=True)
-        },
-        required_exts=['.pdf']
-    ).load_data()
-    if len(documents) == 0:
-        return []
-    processed_documents = []
-    for document in documents:
-        if document.text.strip():
-            document.text = remove_space_between_english_and_chinese(document.text)
-            processed_documents.append(document)
-
-    # 初始化嵌入模型
-    embed_model = OpenAIEmbedding(
-        api_key=embedding_api_key,
-        api_base=embedding_api_base,
-        http_client=httpx.Client(proxies={"http://": proxy, "https://": proxy})
-    )
 
+def nodes_to_result(nodes: Sequence[BaseNode]) -> List[Dict]:
+    return [chunk_to_result(content, node.metadata, node.embedding) for node in nodes if
+            (content := node.get_content().strip())]
+
+
+def iter_file_packs(files: Sequence, max_bytes: int = FILE_PACK_BYTES) -> Iterator[List]:
+    """按文件大小把文件依次分批，每批总大小不超过 max_bytes，单个大文件自成一批。"""
+    pack = []
+    size = 0
+    for file in files:
+        file_size = Path(file).stat().st_size
+        if pack and size + file_size > max_bytes:
+            yield pack
+            pack, size = [], 0
+        pack.append(file)
+        size += file_size
+    if pack:
+        yield pack
+
+
+def get_deduplicator(splitter: BaseSentenceSplitter) -> Optional[BlockDeduplicator]:
+    return BlockDeduplicator() if splitter.deduplicate else None
+
+
+def get_file_walker(splitter: Optional[BaseSentenceSplitter]) -> FileWalker:
+    if splitter is None or splitter.file_walker is None:
+        return FileWalker()
+    return splitter.file_walker
+
+
+def walk_files(path: str, splitter: Optional[BaseSentenceSplitter], required_exts: Optional[List[str]] = None,
+               recursive: bool = True) -> List[Path]:
+    files = get_file_walker(splitter).walk(path, required_exts, recursive)
+    if not files:
+        raise ValueError(f"No files found in {path}.")
+    return files
+
+
+def iter_pack_documents(files: Sequence, file_extractor: Dict[str, BaseReader],
+                        splitter: BaseSentenceSplitter,
+                        deduplicator: Optional[BlockDeduplicator] = None) -> Iterator[Tuple[Any, List[Dict]]]:
+    """
+    分批加载并切分文件，同一批文件的句子组一起规划嵌入请求，小文件很多时请求也能装满 token 预算。
+    按输入顺序逐个产出 (文件, 片段)，没有内容的文件产出空列表。
+
+    :param deduplicator: 不为空时去除之前的文件中出现过的文本块，同一个实例在多批之间共享
+    """
+    metrics = get_metrics()
+    for pack in iter_file_packs(files):
+        loaded = []
+        with metrics.stage('load'):
+            for file in pack:
+                check_cancelled()
+                loaded.append((file, SimpleDirectoryReader.load_file(Path(file), default_file_metadata_func,
+                                                                     file_extractor)))
+
+        processed_documents = []
+        with metrics.stage('normalize'):
+            for _, documents in loaded:
+                for document in documents:
+                    if document.text.strip():
+                        document.text = splitter.text_normalizer.normalize(document.text)
+                        processed_documents.append(document)
+        if deduplicator is not None:
+            with metrics.stage('dedup'):
+                for document in processed_documents:
+                    document.text, removed = deduplicator.deduplicate(document.text)
+                    record_suppressed(removed, 'duplicate_lines', splitter.get_token_model())
+            processed_documents = [document for document in processed_documents if document.text.strip()]
+        metrics.count('documents', len(processed_documents))
+
+        nodes_by_id = dict(zip((document.id_ for document in processed_documents),
+                               splitter.build_semantic_nodes_from_documents(processed_documents)))
+        for file, documents in loaded:
+            result = []
+            for document in documents:
+                if document.id_ in nodes_by_id:
+                    nodes = splitter._postprocess_parsed_nodes(nodes_by_id[document.id_], {document.id_: document})
+                    result.extend(nodes_to_result(nodes))
+            yield file, result
+
+
+def iter_pdf_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                      embed_model: Optional[OpenAIEmbedding] = None,
+                      splitter: Optional[BaseSentenceSplitter] = None,
+                      pdf_workers: Optional[int] = None,
+                      journal: Optional[SplitJournal] = None) -> Iterator[List[Dict]]:
+    files = walk_files(path, splitter, ['.pdf'])
     # 初始化语义分块器
-    splitter = BaseSentenceSplitter(
-        buffer_size=1,
-        embed_model=embed_model,
-        sentence_splitter=split_by_sentence_tokenizer,
-        breakpoint_percentile_threshold=80
-    )
-    nodes = splitter.get_nodes_from_documents(processed_documents)
-    result = [{"pageContent": content, "metadata": node.metadata} for node in nodes if
-              (content := node.get_content().strip())]
-    return result
-
-
-def get_text_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str) -> List[Document]:
-    input_files = None
-    input_dir = None
-    if Path(path).is_file():
-        input_files = [path]
-    if Path(path).is_dir():
-        input_dir = path
-
-    documents = SimpleDirectoryReader(
-        exclude_hidden=False,
-        input_files=input_files,
-        input_dir=input_dir,
-        file_extractor={
-            ".txt": TXTReader()
-        },
-        required_exts=['.txt']
-    ).load_data()
-    if len(documents) == 0:
-        return []
-
-    processed_documents = []
-    for document in documents:
-        if document.text.strip():
-            document.text = remove_space_between_english_and_chinese(document.text)
-            processed_documents.append(document)
-
-    # 初始化嵌入模型
-    embed_model = OpenAIEmbedding(
-        api_key=embedding_api_key,
-        api_base=embedding_api_base,
-        http_client=httpx.Client(proxies={"http://": proxy, "https://": proxy})
-    )
-    splitter = BaseSentenceSplitter(
-        buffer_size=1,
-        embed_model=embed_model,
-        sentence_splitter=split_by_sentence_tokenizer,
-        breakpoint_percentile_threshold=80
-    )
-    nodes = splitter.get_nodes_from_documents(processed_documents)
-    result = [{"pageContent": content, "metadata": node.metadata} for node in nodes if
-              (content := node.get_content().strip())]
-    return result
-
-
-# def split_by_ast(text: str, metadata: Optional[Dict]):
-#     suffix = metadata.get("suffix")
-#     return CODEReader.extract_top_level_nodes(source_code=text, suffix=suffix)
-
-
-def get_code_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str) -> List[Document]:
-    input_files = None
-    # input_dir = None
-    # if Path(path).is_file():
-    #     input_files = [path]
-    # if Path(path).is_dir():
-    #     input_dir = path
-    # documents = SimpleDirectoryReader(
-    #     exclude_hidden=False,
-    #     recursive=True,
-    #     input_files=input_files,
-    #     input_dir=input_dir,
-    #     file_extractor={
-    #         ".py": CODEReader(),
-    #         ".php": CODEReader(),
-    #         ".js": CODEReader(),
-    #         ".ts": CODEReader(),
-    #         ".go": CODEReader(),
-    #         ".cpp": CODEReader(),
-    #         ".java": CODEReader(),
-    #         ".rb": CODEReader(),
-    #         ".cs": CODEReader(),
-    #     },
-    #     required_exts=['.py', '.php', '.js', '.ts', '.go', '.cpp', '.java', '.rb', '.cs']
-    # ).load_data()
-    #
-    # if len(documents) == 0:
-    #     return []
-    # result = []
-    # for doc in documents:
-    #     chunks = CODEReader.split_code_by_token(doc.get_content(), doc.metadata['suffix'])
-    #     for chunk in chunks:
-    #         result.append({
-    #             "pageContent": chunk,
-    #             "metadata": doc.metadata
-    #         })
-    # return result
+    if splitter is None:
+        if embed_model is None:
+            embed_model = get_embed_model(embedding_api_key, embedding_api_base, proxy)
+        splitter = get_splitter(embed_model)
+
+    reader = Reader(return_full_document=True, num_workers=pdf_workers, strip_boilerplate=splitter.deduplicate,
+                    text_cache=splitter.pdf_cache, token_model=splitter.get_token_model())
+    split_files = partial(iter_pack_documents, file_extractor={".pdf": reader}, splitter=splitter,
+                          deduplicator=get_deduplicator(splitter))
+    try:
+        small_files, large_files = split_large_pdf_files(files, reader)
+        for _, documents in iter_journaled(small_files, split_files, journal):
+            if documents:
+                yield documents
+        if journal is None:
+            for file in large_files:
+                yield from iter_large_pdf_document(file, reader, splitter)
+            return
+        split_large = partial(iter_large_files, split_file=partial(iter_large_pdf_document, reader=reader,
+                                                                    splitter=splitter))
+        for _, documents in iter_journaled(large_files, split_large, journal):
+            if documents:
+                yield documents
+    finally:
+        # 提取文本的进程池在本次任务的所有文件之间复用
+        reader.close()
+
+
+def iter_stream_chunks(texts: Iterable[str], metadata: Dict, splitter: BaseSentenceSplitter,
+                       window_size: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    流式切分一个文档：文本分块输入、规范化、切句，在滑动窗口内检测语义断点，
+    峰值内存只与窗口大小有关，与文档大小无关。流式切分的文档不做跨文件的重复块去除。
+    """
+    get_metrics().count('documents')
+    sentences = iter_sentences(splitter.text_normalizer.iter_normalized(texts, window_size))
+    for chunks, chunk_embeddings in splitter.iter_semantic_chunks(sentences):
+        embeddings = [None] * len(chunks) if chunk_embeddings is None else chunk_embeddings.tolist()
+        yield [chunk_to_result(content, metadata, embedding)
+               for chunk, embedding in zip(chunks, embeddings) if (content := chunk.strip())]
+
+
+def iter_large_text_document(file: Path, splitter: BaseSentenceSplitter) -> Iterator[List[Dict]]:
+    """流式切分单个大文本文件，分块读取，不把整个文件读入内存。"""
+    file = Path(file)
+    metadata = {"file_name": file.name, "source": str(file.resolve()), **default_file_metadata_func(str(file))}
+    yield from iter_stream_chunks(TXTReader.iter_windows(file), metadata, splitter)
+
+
+def iter_large_pdf_document(file: Path, reader: Reader, splitter: BaseSentenceSplitter) -> Iterator[List[Dict]]:
+    """流式切分页数很多的 PDF，边逐页提取边产出片段，元数据与整篇切分时相同。"""
+    file = Path(file)
+    metadata = {"file_name": file.name, **default_file_metadata_func(str(file))}
+    yield from iter_stream_chunks(reader.iter_page_texts(file), metadata, splitter, STREAM_PDF_WINDOW)
+
+
+def iter_large_files(files: Sequence, split_file: Callable[[Any], Iterator[List[Dict]]]
+                     ) -> Iterator[Tuple[Any, List[Dict]]]:
+    """记录进度时以文件为单位，逐个产出 (文件, 流式切分的全部片段)。"""
+    for file in files:
+        yield file, [chunk for chunks in split_file(file) for chunk in chunks]
+
+
+def split_large_pdf_files(files: Sequence, reader: Reader) -> Tuple[List, List]:
+    """:return: (整篇切分的 PDF, 页数超过 STREAM_PDF_PAGES、需要流式切分的 PDF)"""
+    large_files = {file for file in files if reader.count_pages(file) > STREAM_PDF_PAGES}
+    return [file for file in files if file not in large_files], [file for file in files if file in large_files]
+
+
+def iter_text_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                       embed_model: Optional[OpenAIEmbedding] = None,
+                       splitter: Optional[BaseSentenceSplitter] = None,
+                       journal: Optional[SplitJournal] = None) -> Iterator[List[Dict]]:
+    # 文本模式只读取目录的第一层
+    files = walk_files(path, splitter, ['.txt'], recursive=False)
+
+    # 初始化语义分块器
+    if splitter is None:
+        if embed_model is None:
+            embed_model = get_embed_model(embedding_api_key, embedding_api_base, proxy)
+        splitter = get_splitter(embed_model)
+
+    # 大文件单独流式切分
+    large_files = [file for file in files if file.stat().st_size > splitter.stream_threshold]
+    small_files = [file for file in files if file.stat().st_size <= splitter.stream_threshold]
+
+    split_files = partial(iter_pack_documents, file_extractor={".txt": TXTReader()}, splitter=splitter,
+                          deduplicator=get_deduplicator(splitter))
+    for _, documents in iter_journaled(small_files, split_files, journal):
+        if documents:
+            yield documents
+    if journal is None:
+        for file in large_files:
+            yield from iter_large_text_document(file, splitter)
+        return
+    # 记录进度时以文件为单位，大文件切分完成后才产出
+    split_large = partial(iter_large_files, split_file=partial(iter_large_text_document, splitter=splitter))
+    for _, documents in iter_journaled(large_files, split_large, journal):
+        if documents:
+            yield documents
+
+
+def get_pdf_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                     embed_model: Optional[OpenAIEmbedding] = None,
+                     splitter: Optional[BaseSentenceSplitter] = None,
+                     pdf_workers: Optional[int] = None,
+                     journal: Optional[SplitJournal] = None) -> List[Dict]:
+    return [chunk for chunks in iter_pdf_document(path, embedding_api_key, embedding_api_base, proxy,
+                                                  embed_model=embed_model, splitter=splitter,
+                                                  pdf_workers=pdf_workers, journal=journal)
+            for chunk in chunks]
+
+
+def get_text_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                      embed_model: Optional[OpenAIEmbedding] = None,
+                      splitter: Optional[BaseSentenceSplitter] = None,
+                      journal: Optional[SplitJournal] = None) -> List[Dict]:
+    return [chunk for chunks in iter_text_document(path, embedding_api_key, embedding_api_base, proxy,
+                                                   embed_model=embed_model, splitter=splitter, journal=journal)
+            for chunk in chunks]
+
+
+def list_directory_files(path: str, splitter: Optional[BaseSentenceSplitter] = None) -> List[str]:
+    return [str(file.resolve()) for file in walk_files(path, splitter)]
+
+
+def iter_file_documents(files: List[str], splitter: BaseSentenceSplitter,
+                        journal: Optional[SplitJournal] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    目录模式：同类文件集中起来共用一条流水线，文本和 PDF 跨文件合并嵌入请求，代码文件一次并行切分。
+    逐个产出 (文件, 片段)，不支持的文件类型不产出。
+    """
+    text_files = [file for file in files if file.endswith(".txt")]
+    large_files = [file for file in text_files if Path(file).stat().st_size > splitter.stream_threshold]
+    small_files = [file for file in text_files if Path(file).stat().st_size <= splitter.stream_threshold]
+    # 文本和 PDF 共用一个去重器，跨类型的重复内容也只保留第一份
+    deduplicator = get_deduplicator(splitter)
+    text_extractor = {".txt": TXTReader()}
+    yield from iter_journaled(small_files, partial(iter_pack_documents, file_extractor=text_extractor,
+                                                   splitter=splitter, deduplicator=deduplicator), journal)
+    yield from iter_journaled(large_files, partial(iter_large_files, split_file=partial(iter_large_text_document,
+                                                                                        splitter=splitter)), journal)
+    pdf_files = [file for file in files if file.endswith(".pdf")]
+    pdf_reader = Reader(return_full_document=True, strip_boilerplate=splitter.deduplicate,
+                        text_cache=splitter.pdf_cache, token_model=splitter.get_token_model())
+    try:
+        small_pdf_files, large_pdf_files = split_large_pdf_files(pdf_files, pdf_reader)
+        yield from iter_journaled(small_pdf_files, partial(iter_pack_documents, file_extractor={".pdf": pdf_reader},
+                                                           splitter=splitter, deduplicator=deduplicator), journal)
+        yield from iter_journaled(large_pdf_files, partial(iter_large_files, split_file=partial(
+            iter_large_pdf_document, reader=pdf_reader, splitter=splitter)), journal)
+    finally:
+        pdf_reader.close()
+    yield from iter_journaled([file for file in files if is_code_file(file)], iter_code_documents, journal)
+
+
+def iter_directory_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                            embed_model: Optional[OpenAIEmbedding] = None,
+                            splitter: Optional[BaseSentenceSplitter] = None,
+                            journal: Optional[SplitJournal] = None) -> Iterator[List[Dict]]:
+    files = list_directory_files(path, splitter)
+    if splitter is None:
+        if embed_model is None:
+            embed_model = get_embed_model(embedding_api_key, embedding_api_base, proxy)
+        splitter = get_splitter(embed_model)
+
+    for _, documents in iter_file_documents(files, splitter, journal):
+        yield documents
+
+
+def get_directory_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                           embed_model: Optional[OpenAIEmbedding] = None,
+                           splitter: Optional[BaseSentenceSplitter] = None,
+                           journal: Optional[SplitJournal] = None) -> List[Dict]:
+    return [chunk for chunks in iter_directory_document(path, embedding_api_key, embedding_api_base, proxy,
+                                                        embed_model=embed_model, splitter=splitter, journal=journal)
+            for chunk in chunks]
+
+
+def sync_directory_document(path: str, embedding_api_key: str, embedding_api_base: str, proxy: str,
+                            manifest: DirectoryManifest,
+                            embed_model: Optional[OpenAIEmbedding] = None,
+                            splitter: Optional[BaseSentenceSplitter] = None,
+                            journal: Optional[SplitJournal] = None) -> Dict[str, Any]:
+    """
+    增量同步目录：只处理新增或修改过的文件，已删除的文件以 tombstone 的形式返回。
+
+    :return: {"documents": 新切分的片段, "modified": 需要替换旧片段的文件, "deleted": 已删除的文件, "unchanged": 未变化的文件数}
+    """
+    files = list_directory_files(path, splitter)
+    if splitter is None:
+        if embed_model is None:
+            embed_model = get_embed_model(embedding_api_key, embedding_api_base, proxy)
+        splitter = get_splitter(embed_model)
+
+    changes = manifest.diff(files)
+    result = []
+    changed = changes.added + changes.modified
+    processed = set()
+    for file, documents in iter_file_documents(changed, splitter, journal):
+        manifest.update(file, documents)
+        result.extend(documents)
+        processed.add(file)
+    # 不支持的文件类型也记入清单，下次不再重复处理
+    for file in changed:
+        if file not in processed:
+            manifest.update(file, [])
+    deleted = [{"source": file, "chunks": len(manifest.remove(file))} for file in changes.deleted]
+    manifest.save()
+
+    return {
+        "documents": result,
+        "modified": changes.modified,
+        "deleted": deleted,
+        "unchanged": len(changes.unchanged)
+    }
@@ -0,0 +1,202 @@
+"""
+常驻切分进程，一次启动处理多个任务。
+
+目前 Electron 主进程（src/utils/shell.ts 的 runPython）仍然为每个任务单独启动一个入口脚本，不会启动这个进程；
+接入常驻模式时，由主进程在 socket 服务启动后启动一次：
+
+    python worker.py --embedding_api_key ... --embedding_api_base ... --proxy ...
+
+连接后发送 worker_ready，之后主进程通过 split_job 提交任务（job_id、type、path，可选 stream、resume、
+result_format），通过 cancel_job 取消任务，通过 shutdown 在队列处理完后退出；每个任务不论成功、失败或取消
+都以 split_job_result 返回一个带 job_id 的结果。收到 SIGTERM 时取消当前任务后退出。
+"""
+import asyncio
+import json
+import signal
+from argparse import ArgumentParser
+
+from cli import (add_code_arguments, add_embedding_arguments, add_journal_arguments, add_profile_arguments,
+                 add_walker_arguments, get_splitter_from_args, get_split_stats, import_deferred, open_journal)
+from result_format import write_result_file
+from metrics import get_metrics, serialize
+from transport import emit_chunks
+from embedding_scheduler import get_embedding_scheduler
+from cancellation import SplitCancelled, get_cancel_report, get_cancel_token, request_cancel
+import socketio
+
+sio = socketio.AsyncClient()
+
+# 常驻进程：模块、tiktoken 编码器和嵌入客户端只初始化一次，之后通过同一个连接处理多个任务。
+# 处理函数按名称从 utils 中取，utils（以及 llama_index）不在模块顶层导入：spawn 方式下提取 PDF 的子进程
+# 会重新导入 __main__，顶层导入 utils 会让每个子进程都加载一次 llama_index
+JOB_HANDLERS = {
+    'pdf': 'get_pdf_document',
+    'text': 'get_text_document',
+    'code': 'get_code_document',
+    'dir': 'get_directory_document',
+}
+STREAM_HANDLERS = {
+    'pdf': 'iter_pdf_document',
+    'text': 'iter_text_document',
+    'dir': 'iter_directory_document',
+}
+
+jobs: asyncio.Queue = None
+splitter = None
+current_job = None
+# 还在队列中就被取消的任务，轮到时直接报告取消
+cancelled_jobs = set()
+stopping = False
+
+
+def signal_handler(sig, frame):
+    global stopping
+    print('Interrupt signal received, cancelling...')
+    stopping = True
+    request_cancel('SIGTERM')
+    if current_job is None:
+        asyncio.get_running_loop().create_task(sio.disconnect())
+
+
+signal.signal(signal.SIGTERM, signal_handler)
+
+
+def run_job(job: dict, handlers: dict = JOB_HANDLERS, journal=None):
+    name = handlers.get(job.get('type'))
+    if name is None:
+        raise ValueError(f"unknown job type: {job.get('type')}")
+    import utils
+    handler = getattr(utils, name)
+    options = {}
+    if job.get('type') == 'code':
+        # 与 semantic_splitter_code.py 一致，代码任务使用 --code_chunk_tokens 和 --code_workers
+        options = {"max_tokens": args.code_chunk_tokens, "num_workers": args.code_workers}
+    return handler(path=job['path'], embedding_api_key=args.embedding_api_key,
+                   embedding_api_base=args.embedding_api_base, proxy=args.proxy,
+                   splitter=splitter, journal=journal, **options)
+
+
+async def process_job(job: dict) -> str:
+    """
+    执行一个任务，返回序列化后的 split_job_result；结果序列化成功后才结束进度日志。
+    """
+    payload = {"job_id": job.get('job_id')}
+    if splitter.embedding_cache is not None:
+        splitter.embedding_cache.reset_stats()
+    if splitter.pdf_cache is not None:
+        splitter.pdf_cache.reset_stats()
+    get_embedding_scheduler().reset_stats()
+    get_metrics().reset()
+    token = get_cancel_token()
+    if not stopping:
+        token.reset()
+    if job.get('job_id') in cancelled_jobs:
+        cancelled_jobs.discard(job.get('job_id'))
+        token.cancel('cancel_job')
+    journal = None
+    try:
+        token.check()
+        journal = open_journal(args, job.get('type'), job['path'], job.get('resume'))
+        if job.get('stream') and job.get('type') in STREAM_HANDLERS:
+            batches = run_job(job, STREAM_HANDLERS, journal)
+            payload["result"] = await emit_chunks(sio, 'split_job_chunk', batches, job.get('stream_batch_size', 0),
+                                                  extra={"job_id": job.get('job_id')})
+        else:
+            # 在线程中执行，避免阻塞事件循环导致心跳超时
+            result = await asyncio.to_thread(run_job, job, JOB_HANDLERS, journal)
+            if job.get('result_format') == 'compact':
+                result = await asyncio.to_thread(write_result_file, result, job.get('result_encoding', 'msgpack'))
+            payload["result"] = result
+    except SplitCancelled:
+        payload.update(get_cancel_report())
+    except Exception as e:
+        payload["error"] = str(e)
+    try:
+        payload["stats"] = get_split_stats(splitter, args.profile, job_id=job.get('job_id'),
+                                           type=job.get('type'), path=job.get('path'))
+        message = serialize(payload)
+    finally:
+        if journal is not None:
+            # 失败或取消的任务保留日志，重试时从已完成的文件继续
+            if "error" in payload or payload.get("cancelled") or "stats" not in payload:
+                journal.close()
+            else:
+                journal.complete()
+    return message
+
+
+async def job_loop():
+    global current_job
+    while True:
+        job = await jobs.get()
+        current_job = job
+        job_id = job.get('job_id') if isinstance(job, dict) else None
+        try:
+            # 统计、写 profile 和序列化失败时也要给这个 job_id 返回结果，主进程不会一直等待
+            try:
+                message = await process_job(job)
+            except Exception as e:
+                message = serialize({"job_id": job_id, "error": str(e)})
+            await sio.emit('split_job_result', message)
+        except Exception as e:
+            print(f'cannot send result of job {job_id}: {e}')
+        finally:
+            current_job = None
+            jobs.task_done()
+        if stopping:
+            await sio.disconnect()
+            break
+
+
+@sio.event
+async def connect():
+    await sio.emit('worker_ready', json.dumps({"job_types": list(JOB_HANDLERS)}))
+
+
+@sio.on('split_job')
+async def split_job(data):
+    job = json.loads(data) if isinstance(data, str) else data
+    await jobs.put(job)
+    return 'Job received'
+
+
+@sio.on('cancel_job')
+async def cancel_job(data):
+    job_id = (json.loads(data) if isinstance(data, str) else data).get('job_id')
+    if current_job is not None and current_job.get('job_id') == job_id:
+        get_cancel_token().cancel('cancel_job')
+    else:
+        cancelled_jobs.add(job_id)
+    return 'Cancelling'
+
+
+@sio.on('shutdown')
+async def shutdown(data=None):
+    await jobs.join()
+    await sio.disconnect()
+
+
+async def main():
+    parser = ArgumentParser()
+    add_embedding_arguments(parser)
+    add_code_arguments(parser)
+    add_walker_arguments(parser)
+    add_journal_arguments(parser)
+    add_profile_arguments(parser)
+    global args, jobs, splitter
+    args = parser.parse_args()
+
+    jobs = asyncio.Queue()
+    await import_deferred('utils')
+    splitter = get_splitter_from_args(args)
+    from batch_planner import get_tokenizer
+    get_tokenizer()
+
+    loop_task = asyncio.create_task(job_loop())
+    await sio.connect('http://127.0.0.1:7765')
+    await sio.wait()
+    loop_task.cancel()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
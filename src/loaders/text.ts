@@ -16,13 +16,20 @@ class TextLoader {
       if(getProxyAgent(embeddingConfig.enableProxy, proxy)){
         args.push('--proxy', proxy)
       }
+      // 边切分边接收片段，页数很多的 PDF 和大文本文件不必等整个文件切分完成
+      args.push('--stream')
+      const messages: Document[] = []
       return runPython<string>({
           scriptPath,
           args,
           socketEvent:'split_text_result',
-          signalId
-        }).then(json=>{
-          const messages = JSON.parse(json) as Document[]
+          signalId,
+          events: {
+            'split_text_result_chunk': (json: string)=>{
+              messages.push(...(JSON.parse(json).documents as Document[]))
+            }
+          }
+        }).then(()=>{
           return messages.map(message=>{
             return new Document({
               pageContent: message.pageContent,
@@ -4,6 +4,7 @@ import { Document } from '@/types/document';
 import {existsSync, mkdirSync, writeFileSync} from 'fs'
 import { documentsOutputDir } from '@/config';
 import { runPython } from '@/utils/shell';
+import { parseSplitResult } from '@/utils/result';
 import { getEmbeddingConfig, getProxy } from '@/electron/storage';
 import { getProxyAgent } from '@/utils/default';
 import { Open } from 'unzipper';
@@ -69,7 +70,7 @@ class ZIPLoader{
           args,
           socketEvent:'split_zip_result'
         }).then(json=>{
-          const messages = JSON.parse(json) as Document[]
+          const messages = parseSplitResult(json)
           return messages.map(message=>{
             return new Document({
               pageContent: message.pageContent,
@@ -0,0 +1,48 @@
+import { readFileSync, rmSync } from 'fs'
+
+// 与 python_code/result_format.py 的 COMPACT_FORMAT 一致
+const COMPACT_FORMAT = 'compact-v1'
+
+interface SplitChunk {
+  pageContent: string
+  metadata: Record<string, any>
+  embedding?: number[]
+}
+
+interface CompactReference {
+  format: string
+  encoding: string
+  result_file: string
+}
+
+interface CompactColumns {
+  metadata: Record<string, any>[]
+  pageContent: string[]
+  metadataIndex: number[]
+  embedding?: number[][]
+}
+
+// 解析切分脚本的结果：普通的 JSON 数组直接返回；--result_format compact 时只收到结果文件的引用，
+// 读取文件并还原成数组，读取后删除文件。主进程只能读取 --result_encoding json 的文件
+export const parseSplitResult = (json: string): SplitChunk[] => {
+  const data = JSON.parse(json)
+  if(Array.isArray(data) || data?.format !== COMPACT_FORMAT){
+    return data
+  }
+  const reference = data as CompactReference
+  try {
+    if(reference.encoding !== 'json'){
+      throw new Error(`unsupported result encoding: ${reference.encoding}, use --result_encoding json`)
+    }
+    const columns = JSON.parse(readFileSync(reference.result_file, 'utf-8')) as CompactColumns
+    return columns.pageContent.map((pageContent, i)=>{
+      const chunk: SplitChunk = { pageContent, metadata: columns.metadata[columns.metadataIndex[i]] }
+      if(columns.embedding){
+        chunk.embedding = columns.embedding[i]
+      }
+      return chunk
+    })
+  } finally {
+    rmSync(reference.result_file, { force: true })
+  }
+}
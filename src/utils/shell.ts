@@ -12,9 +12,11 @@ interface PythonParams{
   args: string[],
   socketEvent: string
   signalId?:string
+  // 结果之前的中间事件，例如 --stream 时的 <socketEvent>_chunk 和 split_stats
+  events?: Record<string, (content: string)=>void>
 }
 
-export const runPython = async <T>({scriptPath, args, socketEvent, signalId}:PythonParams):Promise<T>=>{
+export const runPython = async <T>({scriptPath, args, socketEvent, signalId, events = {}}:PythonParams):Promise<T>=>{
   let _socket:Socket<DefaultEventsMap, DefaultEventsMap> = null
   return new Promise<T>((resolve, reject)=>{
       const onKill = (e:any,id:string)=>{
@@ -29,6 +31,8 @@ export const runPython = async <T>({scriptPath, args, socketEvent, signalId}:Pyt
         console.log('off', err);
         if(_socket){
           _socket?.off(socketEvent, onSocketEvent)
+          _socket?.off('split_cancelled', onCancelled)
+          Object.entries(events).forEach(([event, handler])=>_socket?.off(event, handler))
           _socket = null
         }
         global.wss?.off('connection', onConnection)
@@ -57,9 +61,15 @@ export const runPython = async <T>({scriptPath, args, socketEvent, signalId}:Pyt
           shell.kill('SIGTERM')
           resolve(content)
         }
+        // 脚本取消后发送 split_cancelled 并自行断开，不需要确认
+        const onCancelled = (report: string)=>{
+          off(report)
+        }
         const onConnection = (socket:  Socket<DefaultEventsMap, DefaultEventsMap>)=>{
           console.log('user connected');
           _socket = socket
+          Object.entries(events).forEach(([event, handler])=>socket.on(event, handler))
+          socket.once('split_cancelled', onCancelled)
           socket.once(socketEvent, onSocketEvent);
         }
         global.wss.once('connection', onConnection)